@@ -0,0 +1,46 @@
+import neal
+import numpy as np
+from data.sp_data import SPData
+from data.sp_cache import CoverageCache
+from models import SPQuboBinary, SPAnnealer
+from models.sp_qubo_binary import coverage_violations
+import time
+import os
+import tempfile
+
+"""
+Compares the built-in batch annealer SPAnnealer with neal on the gen_problem families.
+Both samplers get the same sparse QUBO, number of reads and sweeps; reported are the
+runtime, the best and mean energy and the fraction of samples covering every street point.
+"""
+
+param_list = [
+    {"version": 1, "num_cols": 20, "rad_max": 2.4},
+    {"version": 1, "num_cols": 60, "rad_max": 2.4},
+    {"version": 2, "num_cols": 20, "rad_max": 2.8},
+    {"version": 2, "num_cols": 50, "rad_max": 2.8},
+    {"version": 3, "num_cols": 10, "rad_max": 2.8},
+    {"version": 3, "num_cols": 25, "rad_max": 2.8},
+]
+config = {"num_reads": 100, "num_sweeps": 1000, "seed": 1}
+
+samplers = {
+    "neal": neal.SimulatedAnnealingSampler().sample_qubo,
+    "SPAnnealer": SPAnnealer().sample_qubo,
+}
+
+cache = CoverageCache(os.path.join(tempfile.gettempdir(), "sp_coverage_cache"))
+
+print(f"{'problem':<28}{'size':>6}  {'sampler':<12}{'runtime':>9}{'best':>10}{'mean':>10}{'feasible':>10}")
+for params in param_list:
+    data = SPData().gen_problem(**params, cache=cache)
+    model = SPQuboBinary(data, sparse=True)
+    Q = model.to_qubo_dict()
+    name = f"v{params['version']} cols={params['num_cols']} r={params['rad_max']}"
+    for sampler_name, sample_qubo in samplers.items():
+        start_time = time.time()
+        answer = sample_qubo(Q, **config)
+        runtime = time.time() - start_time
+        feasible = np.mean(coverage_violations(model.incidence, model.lidar_samples(answer)) == 0)
+        energies = answer.record.energy
+        print(f"{name:<28}{model.model.shape[0]:>6}  {sampler_name:<12}{runtime:>9.2f}{energies.min():>10.1f}{energies.mean():>10.2f}{feasible:>10.2f}")
@@ -0,0 +1,221 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import scipy
+
+from data.sp_data import SPData
+from data.glb_reader_small import create_problem_from_glb
+from data.sp_metrics import tracer
+from models import SPQuboBinary, SPAnnealer
+from models.sp_qubo_binary import qubo_matrix
+from models.sp_reduction import ReductionPipeline
+from evaluation.evaluation import SPEvaluation
+
+"""
+Stage-by-stage benchmark of the pipeline on the gen_problem versions over size ladders and on
+GLB scenes of several densities. Every instance runs through
+
+    generation     problem dict (gen_problem_dict / create_problem_from_glb)
+    coverage       SPData.create_graph_from_dict (lidar placement and coverage matrix)
+    preprocessing  ReductionPipeline on the coverage (the reduction of SPQuboBinary(process=True))
+    qubo           QUBO assembly (qubo_matrix) on the instance reduced by the preprocessing stage
+    solve          SPQuboBinary(process=True, sparse=True).solve with SPAnnealer, the model is
+                   built outside the stages, its matrix is the one of the qubo stage
+    evaluation     merge_decisions and SPEvaluation
+
+Times are the minimum over --repeat runs, the peak memory per stage (tracemalloc, memory newly
+allocated within the stage) is measured in a separate run, as tracing slows down the stages.
+
+    python benchmark_stages.py --suite quick --out baseline.json
+    python benchmark_stages.py --suite quick --out current.json --baseline baseline.json
+
+With --baseline every stage that got slower (or needs more memory) by more than --threshold
+is flagged and the exit code is 1. --trace writes the spans and counters the modules report
+to data.sp_metrics.tracer during the timed runs.
+"""
+
+STAGES = ("generation", "coverage", "preprocessing", "qubo", "solve", "evaluation")
+
+suites = {
+    "quick": {
+        "gen_problem": [(1, 20, 2.4), (1, 80, 2.4), (2, 20, 2.8), (2, 60, 2.8), (3, 10, 2.8), (3, 30, 2.8)],
+        "glb": [(0.1, 0.1)],
+    },
+    "full": {
+        "gen_problem": [(1, n, 2.4) for n in (20, 80, 320, 1280)]
+            + [(2, n, 2.8) for n in (20, 80, 320, 1280)]
+            + [(3, n, 2.8) for n in (10, 40, 160, 640)],
+        "glb": [(0.1, 0.1), (0.1, 0.3), (0.5, 0.3), (0.5, 0.5)],
+    },
+}
+
+
+def instances(suite, glb_file):
+    """(name, parameters, generate function, sensor parameters) of the instances of the suite."""
+    res = []
+    for version, num_cols, rad_max in suites[suite]["gen_problem"]:
+        res.append((
+            f"gen_v{version}_cols{num_cols}_r{rad_max}",
+            {"version": version, "num_cols": num_cols, "rad_max": rad_max},
+            lambda version=version, num_cols=num_cols: SPData.gen_problem_dict(num_cols, version),
+            SPData.gen_problem_params(rad_max),
+        ))
+    if glb_file is not None and os.path.exists(glb_file):
+        for lidar_density, street_point_density in suites[suite]["glb"]:
+            res.append((
+                f"glb_lid{lidar_density}_sp{street_point_density}",
+                {"glb": glb_file, "lidar_density": lidar_density, "street_point_density": street_point_density},
+                lambda l=lidar_density, s=street_point_density: create_problem_from_glb(l, s, filename=glb_file),
+                {},
+            ))
+    elif glb_file is not None:
+        print(f"{glb_file} not found, GLB instances skipped")
+    return res
+
+
+def run_instance(generate, sensor_params, config, memory = False):
+    """
+    Runs all stages once. Returns {stage: seconds} or, with memory=True, {stage: peak bytes}
+    together with the sizes and results of the instance.
+    """
+    measured = {}
+
+    def stage(name, func):
+        if memory:
+            tracemalloc.start()
+            res = func()
+            measured[name] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            start_time = time.perf_counter()
+            res = func()
+            measured[name] = time.perf_counter() - start_time
+        return res
+
+    # the models print their progress, the table of the benchmark stays readable without it
+    with contextlib.redirect_stdout(io.StringIO()):
+        problem_dict = stage("generation", generate)
+        data = SPData(**sensor_params)
+        stage("coverage", lambda: data.create_graph_from_dict(problem_dict))
+        reduction = stage("preprocessing", lambda: ReductionPipeline(data.coverage).run())
+        reduced, _, _ = reduction.reduced()
+        # the stages add up: the qubo stage only assembles the already reduced instance
+        stage("qubo", lambda: qubo_matrix(reduced, 1, 2, 2))
+        model = SPQuboBinary(data, process=True, sparse=True)
+        answer = stage("solve", lambda: model.solve(SPAnnealer().sample_qubo, **config))
+        evaluation = stage("evaluation", lambda: SPEvaluation(data, model.merge_decisions(answer["solution"])))
+
+    info = {
+        "lidars": len(data.lidars),
+        "street_points": len(data.street_points),
+        "edges": int(data.coverage.nnz),
+        "variables": model.model.shape[0],
+        "qubo_nnz": int(model.model.nnz),
+        "objective": evaluation.get_objective(),
+        "missing_achievable_coverage": evaluation.missing_achievable_coverage,
+    }
+    return measured, info
+
+
+def run_suite(suite, glb_file, config, repeat):
+    results = []
+    print(f"{'instance':<30}" + "".join(f"{s:>14}" for s in STAGES) + f"{'peak MB':>10}")
+    for name, params, generate, sensor_params in instances(suite, glb_file):
+        times = {s: [] for s in STAGES}
+        for _ in range(repeat):
+            measured, info = run_instance(generate, sensor_params, config)
+            for s in STAGES:
+                times[s].append(measured[s])
+        peaks, _ = run_instance(generate, sensor_params, config, memory=True)
+        stages = {s: {"time": min(times[s]), "peak_bytes": peaks[s]} for s in STAGES}
+        results.append({"instance": name, "params": params, "size": info, "stages": stages})
+        print(f"{name:<30}" + "".join(f"{stages[s]['time']:>14.4f}" for s in STAGES) + f"{max(peaks.values()) / 2**20:>10.1f}")
+    return results
+
+
+def compare(results, baseline, threshold, min_time = 0.005, min_bytes = 2**20):
+    """
+    Stages of results that are slower or need more memory than in baseline by more than the
+    relative threshold. Differences below min_time seconds and min_bytes are ignored as noise.
+    """
+    base = {r["instance"]: r["stages"] for r in baseline["results"]}
+    regressions = []
+    print(f"\n{'instance':<30}{'stage':<15}{'base s':>10}{'now s':>10}{'ratio':>8}{'base MB':>10}{'now MB':>10}{'mem ratio':>10}")
+    for r in results:
+        if r["instance"] not in base:
+            continue
+        for s in STAGES:
+            old, new = base[r["instance"]].get(s), r["stages"][s]
+            if old is None:
+                continue
+            ratio = new["time"] / old["time"] if old["time"] > 0 else float("inf")
+            mem_ratio = new["peak_bytes"] / old["peak_bytes"] if old["peak_bytes"] > 0 else float("inf")
+            slower = ratio > 1 + threshold and new["time"] - old["time"] > min_time
+            larger = mem_ratio > 1 + threshold and new["peak_bytes"] - old["peak_bytes"] > min_bytes
+            flag = " ".join(f for f, c in (("SLOWER", slower), ("MEMORY", larger)) if c)
+            if flag:
+                regressions.append({"instance": r["instance"], "stage": s, "ratio": ratio, "memory_ratio": mem_ratio})
+            print(
+                f"{r['instance']:<30}{s:<15}{old['time']:>10.4f}{new['time']:>10.4f}{ratio:>8.2f}"
+                f"{old['peak_bytes'] / 2**20:>10.1f}{new['peak_bytes'] / 2**20:>10.1f}{mem_ratio:>10.2f}  {flag}"
+            )
+    return regressions
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Stage-by-stage benchmark of the sensor positioning pipeline.")
+    parser.add_argument("--suite", choices=sorted(suites), default="quick")
+    parser.add_argument("--glb", default="data/simObjectsExport_utc_2023_5_11.glb", help="GLB scene, skipped if missing")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per instance, the fastest one counts")
+    parser.add_argument("--num-reads", type=int, default=10)
+    parser.add_argument("--num-sweeps", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown flagged as regression")
+    parser.add_argument("--trace", help="write the spans and counters of the modules as JSON")
+    args = parser.parse_args(argv)
+
+    config = {"num_reads": args.num_reads, "num_sweeps": args.num_sweeps, "seed": args.seed}
+    if args.trace:
+        tracer.enable()
+    results = run_suite(args.suite, args.glb, config, args.repeat)
+    if args.trace:
+        tracer.disable()
+        tracer.to_json(args.trace, indent=1)
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "suite": args.suite,
+            "repeat": args.repeat,
+            "config": config,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        print(f"\n{len(regressions)} regressions beyond {args.threshold:.0%}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
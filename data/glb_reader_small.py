@@ -2,8 +2,7 @@ from pygltflib import GLTF2
 import numpy as np
 import json
 import math
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d.art3d import Poly3DCollection
+import os
 from datetime import datetime
 
 from scipy.spatial.transform import Rotation as R
@@ -105,6 +104,8 @@ def create_object(data, ax, mesh, xmintotal, xmaxtotal, ymintotal, ymaxtotal, wa
     ymax=-10000
     ymin=10000
 
+    from mpl_toolkits.mplot3d.art3d import Poly3DCollection
+
     # Add the polygon to the plot
     #ax.add_collection3d(Poly3DCollection(verts, facecolors='cyan', linewidths=1, edgecolors='green', alpha=.25))
     ax.add_collection3d(Poly3DCollection([baseverts], linewidths=1, edgecolors='red', alpha=.25))
@@ -117,18 +118,98 @@ def create_object(data, ax, mesh, xmintotal, xmaxtotal, ymintotal, ymaxtotal, wa
     
     return min(xmin, xmintotal), max(xmax, xmaxtotal), min(ymin, ymintotal), max(ymax, ymaxtotal), basevertslist, size_z
 
+def load_glb_geometry(filename):
+    """
+    Base edges of the walls and boxes of a GLB file, computed straight from the GLTF2 nodes
+    and accessor bounds without plotting. The result is cached per file (path and mtime),
+    so several densities over one scene parse the file only once:
+    {"walls": (N, 2, 2) edges, "wall_heights": (N,), "boxes": (M, 4, 2, 2) edges, "box_heights": (M,),
+    "bounds": (xmin, xmax, ymin, ymax)}
+    """
+    path = os.path.abspath(filename)
+    key = (path, os.stat(path).st_mtime_ns)
+    if key not in _geometry_cache:
+        for old in [k for k in _geometry_cache if k[0] == path]:
+            del _geometry_cache[old]
+        _geometry_cache[key] = _glb_geometry(GLTF2().load(path))
+    return _geometry_cache[key]
+
+
+_geometry_cache = {}
+
+
+def _glb_geometry(glb):
+    walls = [node for node in glb.nodes if node.name == "WallMesh"]
+    boxes = [node for node in glb.nodes if node.name == "Box"]
+    wall_edges, wall_heights = _object_edges(glb, walls, "WallMesh")
+    box_edges, box_heights = _object_edges(glb, boxes, "Box")
+
+    points = np.concatenate((wall_edges.reshape(-1, 2), box_edges.reshape(-1, 2)))
+    bounds = (10000, -10000, 10000, -10000)
+    if len(points):
+        bounds = (min(points[:, 0].min(), 10000), max(points[:, 0].max(), -10000), min(points[:, 1].min(), 10000), max(points[:, 1].max(), -10000))
+    return {
+        "walls": wall_edges,
+        "wall_heights": wall_heights,
+        "boxes": box_edges,
+        "box_heights": box_heights,
+        "bounds": tuple(float(b) for b in bounds),
+    }
+
+
+def _object_edges(glb, nodes, name):
+    """Same geometry as create_object, for all nodes of one kind at once."""
+    num_edges = 1 if name == "WallMesh" else 4
+    if not nodes:
+        return np.zeros((0, num_edges, 2, 2)) if num_edges > 1 else np.zeros((0, 2, 2)), np.zeros(0)
+
+    accessors = [glb.accessors[glb.meshes[node.mesh].primitives[0].attributes.POSITION] for node in nodes]
+    min_vals = np.array([transform_coordinates_gltf_to_visualization(a.min) for a in accessors], dtype=np.float64)
+    max_vals = np.array([transform_coordinates_gltf_to_visualization(a.max) for a in accessors], dtype=np.float64)
+    # Max and Min Vals [0] are swapped due to the rotated coord system
+    min_vals[:, 0], max_vals[:, 0] = max_vals[:, 0].copy(), min_vals[:, 0].copy()
+    size = max_vals - min_vals
+    translation = np.array([
+        transform_coordinates_gltf_to_visualization(node.translation if node.translation is not None else [0, 0, 0])
+        for node in nodes
+    ], dtype=np.float64)
+    center = (min_vals + max_vals) / 2 + translation
+    rotation = R.from_quat([
+        transform_coordinates_gltf_to_visualization(node.rotation if node.rotation is not None else [0, 0, 0, 1])
+        for node in nodes
+    ])
+
+    half = size / 2
+    top = translation[:, 2] + size[:, 2]
+    def vertex(sx, sy):
+        return np.stack((translation[:, 0] + sx * half[:, 0], translation[:, 1] + sy * half[:, 1], top), axis=1)
+
+    if name == "WallMesh":
+        # the direction of the walls alternates, starting with (+x, -y) for the first wall
+        first, second = vertex(1, -1), vertex(-1, 1)
+        odd = (np.arange(len(nodes)) % 2 == 1)[:, None]
+        vertices = [np.where(odd, second, first), np.where(odd, first, second)]
+    else:
+        vertices = [vertex(-1, -1), vertex(1, -1), vertex(1, 1), vertex(-1, 1)]
+    vertices = np.stack(vertices, axis=1) - center[:, None, :]
+    # one apply per object, as in create_object, keeps the results identical to the plotting path
+    base = np.stack([rotation[i].apply(vertices[i]) for i in range(len(nodes))]) + center[:, None, :]
+    base = base[:, :, :2]
+
+    if name == "WallMesh":
+        return base, size[:, 2]
+    return np.stack((base, np.roll(base, -1, axis=1)), axis=2), size[:, 2]
+
+
 def create_street_points(xmin, xmax, ymin, ymax, xmargin, ymargin, density): 
-    res=[]
-    yloop=np.linspace(ymin+ymargin,ymax-ymargin,math.ceil((ymax-ymin)*density))
-    x=[]
-    for item in yloop:
-        y=np.linspace(xmin+xmargin, xmax-xmargin, math.ceil((xmax-xmin)*density))*0+ item
-        res.extend(y)
-        x.extend(np.linspace(xmin+xmargin, xmax-xmargin, math.ceil((xmax-xmin)*density)))
-    
-    return list(zip(x,res))
+    """Grid of street points (x, y) with the given density inside the margins as array, row by row."""
+    x, y = np.meshgrid(
+        np.linspace(xmin+xmargin, xmax-xmargin, math.ceil((xmax-xmin)*density)),
+        np.linspace(ymin+ymargin, ymax-ymargin, math.ceil((ymax-ymin)*density))
+    )
+    return np.column_stack((x.ravel(), y.ravel()))
 
-def create_problem_from_glb(lidar_density = 0.1, street_point_density = 0.1, save_as_json = False, show_plot = False):
+def create_problem_from_glb(lidar_density = 0.1, street_point_density = 0.1, save_as_json = False, show_plot = False, filename = "data/simObjectsExport_utc_2023_5_11.glb"):
 
     lidar_height=2.5
     lidar_lateral_offset=0.2
@@ -139,7 +220,35 @@ def create_problem_from_glb(lidar_density = 0.1, street_point_density = 0.1, sav
     xmargin=0.5
     ymargin=0.5
 
-    filename = "data/simObjectsExport_utc_2023_5_11.glb"
+    if show_plot:
+        problem_dict = _create_problem_from_glb_plot(filename, lidar_density, street_point_density, lidar_height, lidar_lateral_offset, lidar_direction_mode, lidar_pitch, pfostenlimit, xmargin, ymargin)
+    else:
+        geometry = load_glb_geometry(filename)
+        lidarwalls = []
+        for edge, size_z in zip(geometry["walls"].tolist(), geometry["wall_heights"].tolist()):
+            lidarwalls.append(edge + [size_z, lidar_density, lidar_height, lidar_lateral_offset, lidar_direction_mode, lidar_pitch])
+        for edges, size_z in zip(geometry["boxes"].tolist(), geometry["box_heights"].tolist()):
+            for edge in edges:
+                lidarwalls.append(edge + [size_z, (size_z > pfostenlimit)* lidar_density, lidar_height, lidar_lateral_offset*(2*(size_z <= pfostenlimit)-1), lidar_direction_mode, lidar_pitch])
+        xmintotal, xmaxtotal, ymintotal, ymaxtotal = geometry["bounds"]
+        sp=create_street_points(xmintotal, xmaxtotal, ymintotal, ymaxtotal, xmargin, ymargin, street_point_density)
+        problem_dict = {'listCovering':sp, 'wall':lidarwalls, 'listLidar': []}
+
+    if save_as_json:
+        now = datetime.now()    
+        date_time = now.strftime("_%Y_%m_%d_%H_%M_%S")   
+        outfile="data/data/tmp"+(filename.replace('/','_')).replace('.','_')+"_lid"+str(lidar_density).replace('.','p')+'_sp'+str(street_point_density).replace('.','p')+date_time+'.json'
+        with open(outfile, "w") as file_write:
+            json.dump({k: v.tolist() if isinstance(v, np.ndarray) else v for k, v in problem_dict.items()}, file_write)
+
+    #print('GLB_reader finished!')
+
+    return problem_dict
+
+
+def _create_problem_from_glb_plot(filename, lidar_density, street_point_density, lidar_height, lidar_lateral_offset, lidar_direction_mode, lidar_pitch, pfostenlimit, xmargin, ymargin):
+    """Reads the GLB file and plots all walls and boxes in a 3D figure."""
+    import matplotlib.pyplot as plt
 
     glb = GLTF2().load(filename)
 
@@ -179,25 +288,13 @@ def create_problem_from_glb(lidar_density = 0.1, street_point_density = 0.1, sav
                 wal.extend([size_z, (size_z > pfostenlimit)* lidar_density, lidar_height, lidar_lateral_offset*(2*(size_z <= pfostenlimit)-1), lidar_direction_mode, lidar_pitch])
                 lidarwalls.append(wal)
 
-    if show_plot:
-        ax.set_xlim([-60, 60])
-        ax.set_ylim([-60, 60])
-        ax.set_zlim([0, 120])
-        plt.show()
+    ax.set_xlim([-60, 60])
+    ax.set_ylim([-60, 60])
+    ax.set_zlim([0, 120])
+    plt.show()
     plt.clf()
 
     sp=create_street_points(xmintotal, xmaxtotal, ymintotal, ymaxtotal, xmargin, ymargin, street_point_density)
     lid= []
 
-    problem_dict = {'listCovering':sp, 'wall':lidarwalls, 'listLidar': lid}
-
-    if save_as_json:
-        now = datetime.now()    
-        date_time = now.strftime("_%Y_%m_%d_%H_%M_%S")   
-        outfile="data/data/tmp"+(filename.replace('/','_')).replace('.','_')+"_lid"+str(lidar_density).replace('.','p')+'_sp'+str(street_point_density).replace('.','p')+date_time+'.json'
-        with open(outfile, "w") as file_write:
-            json.dump(problem_dict, file_write)
-
-    #print('GLB_reader finished!')
-
-    return problem_dict
+    return {'listCovering':sp, 'wall':lidarwalls, 'listLidar': lid}
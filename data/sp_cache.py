@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from pathlib import Path
+
+
+class CoverageCache:
+    """
+    Content-addressed on-disk cache for computed coverages of SPData.
+
+    An entry is keyed by a hash of the problem dict together with the sensor parameters
+    and stores the lidar and street point coordinates, the ids of the street points that
+    are never covered and the CSR arrays of the coverage matrix as .npy files, which are
+    loaded memory-mapped. The total size is limited to max_bytes; the least recently
+    used entries are removed first.
+    """
+
+    version = 1
+    arrays = ("lidars", "street_points", "never_covered", "indptr", "indices")
+
+    def __init__(self, cache_dir, max_bytes = 2**30):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def key(self, problem_dict, sensor_params):
+        h = hashlib.sha256()
+        h.update(f"coverage-v{self.version}".encode())
+        _digest(h, sensor_params)
+        _digest(h, problem_dict)
+        return h.hexdigest()
+
+    def load(self, key):
+        """Arrays of the entry as dict, or None if the key is not cached."""
+        entry = self.cache_dir / key
+        try:
+            with open(entry / "meta.json") as f:
+                meta = json.load(f)
+            if meta["version"] != self.version:
+                return None
+            res = {name: np.load(entry / f"{name}.npy", mmap_mode="r") for name in self.arrays}
+        except (OSError, ValueError, KeyError):
+            return None
+        # the modification time of meta.json marks the last use
+        os.utime(entry / "meta.json")
+        return res
+
+    def store(self, key, **arrays):
+        entry = self.cache_dir / key
+        tmp = Path(tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp_"))
+        try:
+            for name in self.arrays:
+                np.save(tmp / f"{name}.npy", np.ascontiguousarray(arrays[name]))
+            with open(tmp / "meta.json", "w") as f:
+                json.dump({"version": self.version}, f)
+            os.replace(tmp, entry)
+        except OSError:
+            # another process stored the same entry in the meantime
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict(keep=key)
+
+    def entries(self):
+        """(last use, size in bytes, path) of all entries."""
+        res = []
+        for entry in self.cache_dir.iterdir():
+            meta = entry / "meta.json"
+            if entry.name.startswith(".") or not meta.exists():
+                continue
+            size = sum(f.stat().st_size for f in entry.iterdir())
+            res.append((meta.stat().st_mtime, size, entry))
+        return res
+
+    def evict(self, keep = None):
+        entries = sorted(self.entries())
+        total = sum(e[1] for e in entries)
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry.name == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        for _, _, entry in self.entries():
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def _digest(h, obj):
+    """Feeds obj into the hash. Numeric lists and arrays with the same values give the same digest."""
+    if isinstance(obj, dict):
+        h.update(b"{")
+        for k in sorted(obj, key=str):
+            h.update(str(k).encode() + b":")
+            _digest(h, obj[k])
+        h.update(b"}")
+    elif isinstance(obj, str):
+        h.update(b"s" + obj.encode())
+    elif isinstance(obj, (list, tuple, np.ndarray)):
+        try:
+            arr = np.asarray(obj, dtype=np.float64)
+        except (ValueError, TypeError):
+            h.update(b"[")
+            for item in obj:
+                _digest(h, item)
+            h.update(b"]")
+            return
+        if arr.size == 0:
+            arr = arr.reshape(0)
+        h.update(b"a" + str(arr.shape).encode() + np.ascontiguousarray(arr).tobytes())
+    else:
+        h.update(b"f" + np.float64(obj).tobytes())
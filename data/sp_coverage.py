@@ -0,0 +1,437 @@
+import math
+import numpy as np
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from scipy.spatial import cKDTree
+
+
+def in_range(l, s, maxcoverage_meter, vert_ang_max_deg, vert_ang_min_deg, halber_oeffnungswinkel_deg):
+    too_far=math.sqrt((s[0]-l[0])**2+   (s[1]-l[1])**2)>maxcoverage_meter
+    if too_far:
+        return 0
+
+    #relative orientation of street point in the system of the lidar with yaw and pitch
+
+    #angle convention north/clockwise transformed to mathematical angle convention
+    ya=(90-l[3])/180*math.pi
+    #rotation matrix for yaw
+    #if yaw positive (counterclockwise), relative movement of streetpoint is clockwise
+    y=np.array([[math.cos(ya), math.sin(ya), 0],
+       [-math.sin(ya), math.cos(ya), 0],
+       [0,0,1]
+       ])
+
+    pitch_angle=l[4]/180*math.pi
+    #if pitch of lidar upwards, streetpoint is moving downwards
+    p=np.array([[math.cos(pitch_angle), 0, math.sin(pitch_angle)],
+       [0, 1, 0],
+       [-math.sin(pitch_angle), 0, math.cos(pitch_angle)]
+       ])
+    total_rotation=np.matmul(p,y)
+    la=np.array(l[0:3])
+    sa=np.array(s)
+
+
+    rel_rotated=np.matmul(total_rotation, sa-la)
+
+    #decision if streetpoint in vertical FoV
+    vert_angle=math.atan2(rel_rotated[2], math.sqrt(rel_rotated[0]**2+rel_rotated[1]**2))
+    if vert_angle>vert_ang_max_deg/180*math.pi or vert_angle<vert_ang_min_deg/180*math.pi:
+        return 0
+
+    #decision if streetpoint in horizontal FoV
+    hor_angle=math.atan2(rel_rotated[1], rel_rotated[0])
+    if math.fabs(hor_angle)>halber_oeffnungswinkel_deg/180*math.pi:
+        return 0
+
+    return 1
+
+
+def intersect(line, w):
+
+    a=line[1][0]-line[0][0]
+    b=w[0][0]-w[1][0]
+    c=line[1][1]-line[0][1]
+    d=w[0][1]-w[1][1]
+    det=a*d-b*c
+    if det==0:
+        return 0
+    line_s=line[0]
+    lidarh=line_s[2]
+    mauerh=w[2]
+    if mauerh==0:
+        return 0
+    ws=w[0] #eckige Klammer ist Liste ist Vektor
+    diff=[ws[i]-line_s[i] for i in range(len(ws))]
+    im=1.0/det*np.array([[d,-b],[-c,a]])
+    r=np.dot(im,diff)
+    if not (r[0]>0 and r[0]<1 and r[1]>0 and r[1]<1):
+        return 0
+
+    #r[0] Anteil zwischen Lidar und Mauer vergl. zu Lidar und Straßenpunkt, wenn in line erst das lidar kommt
+    if lidarh/mauerh>=1/(1-r[0]):
+        return 0
+    else:
+        return 1
+
+
+def lidar_frames(lidars):
+    """
+    Rotation matrices (pitch after yaw) of all lidars, shape (L, 3, 3).
+    Same convention as in_range, but computed once per lidar.
+    """
+    ya = (90 - lidars[:, 3]) / 180 * math.pi
+    pitch_angle = lidars[:, 4] / 180 * math.pi
+
+    y = np.zeros((len(lidars), 3, 3))
+    y[:, 0, 0] = np.cos(ya)
+    y[:, 0, 1] = np.sin(ya)
+    y[:, 1, 0] = -np.sin(ya)
+    y[:, 1, 1] = np.cos(ya)
+    y[:, 2, 2] = 1
+
+    p = np.zeros((len(lidars), 3, 3))
+    p[:, 0, 0] = np.cos(pitch_angle)
+    p[:, 0, 2] = np.sin(pitch_angle)
+    p[:, 1, 1] = 1
+    p[:, 2, 0] = -np.sin(pitch_angle)
+    p[:, 2, 2] = np.cos(pitch_angle)
+    return np.matmul(p, y)
+
+
+class WallGrid:
+    """
+    Walls as contiguous arrays, indexed in a uniform grid of square cells.
+
+    Every wall is registered in all cells touched by its bounding box. A sight line
+    only has to be tested against the walls registered in the cells touched by its
+    own bounding box; sight lines are at most rad_max long, so with cells of size
+    rad_max that are at most 2x2 cells. Walls of height 0 never block and are left out.
+    """
+
+    def __init__(self, walls3D, cell_size, tol = 1e-9):
+        walls = [w for w in walls3D if w[2] != 0]
+        self.start = np.array([[w[0][0], w[0][1]] for w in walls], dtype=float).reshape(-1, 2)
+        self.end = np.array([[w[1][0], w[1][1]] for w in walls], dtype=float).reshape(-1, 2)
+        self.height = np.array([w[2] for w in walls], dtype=float)
+        self.walls3D = walls
+        self.cell_size = cell_size
+        self.tol = tol
+
+        lo = self.cell_of(np.minimum(self.start, self.end))
+        hi = self.cell_of(np.maximum(self.start, self.end))
+        if len(walls):
+            self.origin = lo.min(axis=0)
+            self.shape = hi.max(axis=0) - self.origin + 1
+        else:
+            self.origin = np.zeros(2, dtype=np.int64)
+            self.shape = np.zeros(2, dtype=np.int64)
+
+        owner, ix, iy = self.__expand_boxes(lo, hi)
+        keys = (ix - self.origin[0]) * self.shape[1] + (iy - self.origin[1])
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        self.wall_ids = owner[order]
+        self.cell_keys, first = np.unique(keys, return_index=True)
+        self.cell_ptr = np.append(first, len(keys))
+
+    def __len__(self):
+        return len(self.height)
+
+    def cell_of(self, xy):
+        return np.floor(xy / self.cell_size).astype(np.int64)
+
+    @staticmethod
+    def __expand_boxes(lo, hi):
+        """All cells (ix, iy) of the boxes lo..hi, together with the index of their box."""
+        nx = hi[:, 0] - lo[:, 0] + 1
+        ny = hi[:, 1] - lo[:, 1] + 1
+        counts = nx * ny
+        owner = np.repeat(np.arange(len(lo)), counts)
+        local = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+        ix = lo[owner, 0] + local // ny[owner]
+        iy = lo[owner, 1] + local % ny[owner]
+        return owner, ix, iy
+
+    def candidates(self, p0, p1):
+        """
+        (line index, wall index) for the walls near the lines p0[k] -> p1[k].
+        A wall may appear more than once for the same line.
+        """
+        lo = self.cell_of(np.minimum(p0, p1))
+        hi = self.cell_of(np.maximum(p0, p1))
+        line, ix, iy = self.__expand_boxes(lo, hi)
+        ix = ix - self.origin[0]
+        iy = iy - self.origin[1]
+        inside = (ix >= 0) & (ix < self.shape[0]) & (iy >= 0) & (iy < self.shape[1])
+        line = line[inside]
+        keys = ix[inside] * self.shape[1] + iy[inside]
+
+        pos = np.searchsorted(self.cell_keys, keys)
+        pos = np.minimum(pos, len(self.cell_keys) - 1)
+        found = self.cell_keys[pos] == keys
+        line, pos = line[found], pos[found]
+
+        counts = self.cell_ptr[pos + 1] - self.cell_ptr[pos]
+        offsets = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+        wall = self.wall_ids[np.repeat(self.cell_ptr[pos], counts) + offsets]
+        return np.repeat(line, counts), wall
+
+    def blocked(self, lidars, points):
+        """
+        Vectorized intersect for the lines lidars[k] -> points[k] (lidars with height in
+        column 2). Returns True where any wall blocks the line. Tests within `tol` of the
+        limits are decided again with the scalar intersect.
+        """
+        result = np.zeros(len(lidars), dtype=bool)
+        if len(self) == 0 or len(lidars) == 0:
+            return result
+        line, wall = self.candidates(lidars[:, 0:2], points[:, 0:2])
+
+        l = lidars[line]
+        s = points[line]
+        ws = self.start[wall]
+        we = self.end[wall]
+        a = s[:, 0] - l[:, 0]
+        b = ws[:, 0] - we[:, 0]
+        c = s[:, 1] - l[:, 1]
+        d = ws[:, 1] - we[:, 1]
+        det = a * d - b * c
+        nonzero = det != 0
+        det = np.where(nonzero, det, 1.0)
+
+        inv = 1.0 / det
+        diff0 = ws[:, 0] - l[:, 0]
+        diff1 = ws[:, 1] - l[:, 1]
+        r0 = (inv * d) * diff0 + (inv * -b) * diff1
+        r1 = (inv * -c) * diff0 + (inv * a) * diff1
+
+        crossing = nonzero & (r0 > 0) & (r0 < 1) & (r1 > 0) & (r1 < 1)
+        #r0 Anteil zwischen Lidar und Mauer vergl. zu Lidar und Straßenpunkt
+        with np.errstate(divide='ignore'):
+            ratio = 1 / (1 - r0)
+        height_ratio = l[:, 2] / self.height[wall]
+        hit = crossing & ~(height_ratio >= ratio)
+
+        near = nonzero & (
+            (np.abs(r0) <= self.tol) | (np.abs(r0 - 1) <= self.tol)
+            | (np.abs(r1) <= self.tol) | (np.abs(r1 - 1) <= self.tol)
+            | (np.abs(height_ratio - ratio) <= self.tol * np.maximum(1, np.abs(ratio)))
+        )
+        for k in np.flatnonzero(near):
+            hit[k] = intersect((l[k].tolist(), s[k].tolist()), self.walls3D[wall[k]])
+
+        result[line[hit]] = True
+        return result
+
+
+class CoverageEngine:
+    """
+    Batched version of the in_range/intersect loops of SPData.create_connections.
+
+    Works on (street point, lidar) index pairs. Pairs whose distance or angles lie
+    within `tol` of a limit are decided again with the scalar in_range, so the
+    resulting edge set is exactly the one of the scalar loops.
+    """
+
+    def __init__(
+            self,
+            lidars,
+            points,
+            walls3D,
+            rad_max,
+            vert_ang_max_deg,
+            vert_ang_min_deg,
+            halber_oeffnungswinkel_deg,
+            chunk_size = 2**14,
+            tol = 1e-9
+        ):
+        self.lidars = np.asarray(lidars, dtype=float).reshape(-1, 5)
+        self.points = np.asarray(points, dtype=float).reshape(-1, 3)
+        self.walls3D = walls3D
+        self.rad_max = rad_max
+        self.vert_ang_max_deg = vert_ang_max_deg
+        self.vert_ang_min_deg = vert_ang_min_deg
+        self.halber_oeffnungswinkel_deg = halber_oeffnungswinkel_deg
+        self.chunk_size = chunk_size
+        self.tol = tol
+
+        self.frames = lidar_frames(self.lidars)
+        self.tree = None
+        self.walls = None
+
+    def prepare(self):
+        """Builds the lidar KD-tree and the wall grid (done before handing the engine to workers)."""
+        if self.tree is None and len(self.lidars):
+            self.tree = cKDTree(self.lidars[:, 0:2])
+        if self.walls is None:
+            self.walls = WallGrid(self.walls3D, max(self.rad_max, self.tol), self.tol)
+
+    def candidate_pairs(self, start, stop):
+        """
+        Pairs of the street points start..stop-1 with all lidars within rad_max (in x/y),
+        street point major. Uses a KD-tree over the lidar positions, so only pairs near
+        enough for a real edge reach the angle and wall tests.
+        """
+        if len(self.lidars) == 0 or stop <= start:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+        self.prepare()
+        # slightly larger radius, the exact distance test is done in in_range_mask
+        radius = self.rad_max * (1 + self.tol) + self.tol
+        hits = self.tree.query_ball_point(self.points[start:stop, 0:2], radius, return_sorted=True)
+        counts = np.fromiter(map(len, hits), dtype=np.intp, count=len(hits))
+        s_idx = np.repeat(np.arange(start, stop), counts)
+        l_idx = np.fromiter(chain.from_iterable(hits), dtype=np.intp, count=int(counts.sum()))
+        return s_idx, l_idx
+
+    def in_range_mask(self, s_idx, l_idx):
+        """Vectorized in_range for the pairs (s_idx[k], l_idx[k])."""
+        diff = self.points[s_idx] - self.lidars[l_idx, 0:3]
+        dist = np.sqrt(diff[:, 0]**2 + diff[:, 1]**2)
+        rel = np.einsum('kij,kj->ki', self.frames[l_idx], diff)
+
+        vert_angle = np.arctan2(rel[:, 2], np.sqrt(rel[:, 0]**2 + rel[:, 1]**2))
+        vert_max = self.vert_ang_max_deg / 180 * math.pi
+        vert_min = self.vert_ang_min_deg / 180 * math.pi
+
+        mask = (dist <= self.rad_max) & (vert_angle <= vert_max) & (vert_angle >= vert_min)
+        near = (np.abs(dist - self.rad_max) <= self.tol * max(1, self.rad_max)) \
+            | (np.abs(vert_angle - vert_max) <= self.tol) \
+            | (np.abs(vert_angle - vert_min) <= self.tol)
+
+        # atan2 never leaves [-pi, pi], so the horizontal test only matters below 180 deg
+        if self.halber_oeffnungswinkel_deg < 180:
+            hor_angle = np.abs(np.arctan2(rel[:, 1], rel[:, 0]))
+            hor_max = self.halber_oeffnungswinkel_deg / 180 * math.pi
+            mask &= hor_angle <= hor_max
+            near |= np.abs(hor_angle - hor_max) <= self.tol
+
+        for k in np.flatnonzero(near):
+            mask[k] = in_range(
+                self.lidars[l_idx[k]], self.points[s_idx[k]], self.rad_max, self.vert_ang_max_deg,
+                self.vert_ang_min_deg, self.halber_oeffnungswinkel_deg
+            )
+        return mask
+
+    def occluded_mask(self, s_idx, l_idx):
+        """Wall test for the pairs (s_idx[k], l_idx[k])."""
+        self.prepare()
+        return self.walls.blocked(self.lidars[l_idx, 0:3], self.points[s_idx])
+
+    def edges(self, start = 0, stop = None, workers = None):
+        """
+        Coverage edges of the street points start..stop-1 as index arrays (s_idx, l_idx),
+        sorted by street point and then lidar like the scalar loops.
+        Street points are processed in batches of chunk_size. With workers > 1 the batches
+        are distributed over a process pool; the result does not depend on workers.
+        """
+        if stop is None:
+            stop = len(self.points)
+        if workers is not None and workers > 1 and stop - start > 1:
+            return self.__edges_parallel(start, stop, workers)
+
+        res_s = []
+        res_l = []
+        for chunk_start in range(start, stop, self.chunk_size):
+            s_idx, l_idx = self.candidate_pairs(chunk_start, min(chunk_start + self.chunk_size, stop))
+            keep = self.in_range_mask(s_idx, l_idx)
+            s_idx, l_idx = s_idx[keep], l_idx[keep]
+            keep = ~self.occluded_mask(s_idx, l_idx)
+            res_s.append(s_idx[keep])
+            res_l.append(l_idx[keep])
+
+        if not res_s:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+        return np.concatenate(res_s), np.concatenate(res_l)
+
+    def tiles(self, tile_size):
+        """
+        Splits the street points into square tiles of tile_size (in x/y). Yields per tile
+        (point ids, lidar ids, engine of the tile): the engine only holds the street points of
+        the tile and the lidars and walls within a halo of rad_max around them. Every sight line
+        of the tile lies in this halo box, so the tile engine finds the same edges as the
+        whole scene; ids are ascending, so the tile edges keep the order of edges().
+        """
+        if len(self.points) == 0:
+            return
+        cells = np.floor(self.points[:, 0:2] / tile_size).astype(np.int64)
+        cells -= cells.min(axis=0)
+        keys = cells[:, 0] * (cells[:, 1].max() + 1) + cells[:, 1]
+        order = np.argsort(keys, kind='stable')
+        bounds = np.flatnonzero(np.diff(keys[order])) + 1
+
+        halo = self.rad_max * (1 + self.tol) + self.tol
+        lidar_order = np.argsort(self.lidars[:, 0], kind='stable')
+        lidar_x = self.lidars[lidar_order, 0]
+        walls = [w for w in self.walls3D if w[2] != 0]
+        wall_lo = np.array([np.minimum(w[0][0:2], w[1][0:2]) for w in walls], dtype=float).reshape(-1, 2)
+        wall_hi = np.array([np.maximum(w[0][0:2], w[1][0:2]) for w in walls], dtype=float).reshape(-1, 2)
+
+        for point_ids in np.split(order, bounds):
+            lo = self.points[point_ids, 0:2].min(axis=0) - halo
+            hi = self.points[point_ids, 0:2].max(axis=0) + halo
+            lidar_ids = lidar_order[np.searchsorted(lidar_x, lo[0], 'left'):np.searchsorted(lidar_x, hi[0], 'right')]
+            y = self.lidars[lidar_ids, 1]
+            lidar_ids = np.sort(lidar_ids[(y >= lo[1]) & (y <= hi[1])])
+            near = np.all(wall_lo <= hi + self.tol, axis=1) & np.all(wall_hi >= lo - self.tol, axis=1)
+            engine = CoverageEngine(
+                self.lidars[lidar_ids], self.points[point_ids], [walls[i] for i in np.flatnonzero(near)],
+                self.rad_max, self.vert_ang_max_deg, self.vert_ang_min_deg, self.halber_oeffnungswinkel_deg,
+                self.chunk_size, self.tol
+            )
+            yield point_ids, lidar_ids, engine
+
+    def tiled_edges(self, tile_size, workers = None):
+        """
+        Coverage edges tile by tile as index arrays (s_idx, l_idx) of the whole scene, sorted by
+        street point and lidar within a tile. Only the tiles in work are held in memory; with
+        workers > 1 up to 2 * workers tiles are computed at once in a process pool.
+        """
+        if workers is None or workers <= 1:
+            for point_ids, lidar_ids, engine in self.tiles(tile_size):
+                s_idx, l_idx = engine.edges()
+                yield point_ids[s_idx], lidar_ids[l_idx]
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            running = deque()
+            for point_ids, lidar_ids, engine in self.tiles(tile_size):
+                running.append((point_ids, lidar_ids, pool.submit(_tile_edges, engine)))
+                if len(running) >= 2 * workers:
+                    point_ids, lidar_ids, future = running.popleft()
+                    s_idx, l_idx = future.result()
+                    yield point_ids[s_idx], lidar_ids[l_idx]
+            while running:
+                point_ids, lidar_ids, future = running.popleft()
+                s_idx, l_idx = future.result()
+                yield point_ids[s_idx], lidar_ids[l_idx]
+
+    def __edges_parallel(self, start, stop, workers):
+        # a few chunks per worker to balance dense and empty parts of the scene
+        step = min(self.chunk_size, max(-(-(stop - start) // (4 * workers)), 1))
+        bounds = [(i, min(i + step, stop)) for i in range(start, stop, step)]
+
+        self.prepare()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self,)) as pool:
+            # map keeps the order of the chunks, so the merge is deterministic
+            results = list(pool.map(_worker_edges, bounds))
+        return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+
+#engine of a worker process, set once by the pool initializer and only read afterwards
+_worker_engine = None
+
+
+def _init_worker(engine):
+    global _worker_engine
+    _worker_engine = engine
+
+
+def _worker_edges(bounds):
+    return _worker_engine.edges(bounds[0], bounds[1])
+
+
+def _tile_edges(engine):
+    return engine.edges()
@@ -4,12 +4,18 @@ import numpy as np
 import networkx as nx
 
 from pathlib import Path
+from scipy import sparse
 
 from .glb_reader_small import create_problem_from_glb
+from .sp_coverage import CoverageEngine, in_range, intersect
+from .sp_metrics import tracer
 
 
 class SPData: 
 
+    #version of the instance directories written by save
+    instance_version = 1
+
     def __init__(
             self, 
             vert_ang_max_deg = 16, 
@@ -25,50 +31,153 @@ class SPData:
         self.halber_oeffnungswinkel_deg = halber_oeffnungswinkel_deg 
         self.lidarwall_offset_m = lidarwall_offset_m
 
-        self.G = nx.Graph()
+        self._G = None
         self.M = nx.Graph()
         self.O = nx.Graph()
         self.schemeGraph = nx.Graph()
 
         self.walls3D = []
-        self.listLidar3D = []
-        self.listStreetPoints3D = []
 
         self.listStreetPointsNeverCovered = []
 
+        #array-backed coverage: lidar id = index in listLidar3D, street point id = index in listStreetPoints3D
+        self.lidars = np.zeros((0, 5))
+        self.street_points = np.zeros((0, 3))
+        #entries that are int in the tuples of listLidar3D/listStreetPoints3D (None, column or element mask)
+        self._lidars_int = None
+        self._street_points_int = None
+        self._listLidar3D = None
+        self._listStreetPoints3D = None
+        #street point x lidar incidence matrix
+        self.coverage = sparse.csr_matrix((0, 0), dtype=np.int8)
+        self._lidar_index = None
+
         #undefined
         self.missing_achievable_coverage=None
         self.never_covered=None
 
     def get_num_variables(self):
-        return len(self.listLidar3D)
+        return len(self.lidars)
+
+    @property
+    def listLidar3D(self):
+        """Lidars as tuples (x, y, z, yaw, pitch), a view of self.lidars built on first access."""
+        if self._listLidar3D is None:
+            self._listLidar3D = _tuples(self.lidars, self._lidars_int)
+        return self._listLidar3D
+
+    @listLidar3D.setter
+    def listLidar3D(self, lidars):
+        self._listLidar3D = list(lidars)
+        self.lidars, self._lidars_int = _rows_to_array(self._listLidar3D, 5)
+
+    @property
+    def listStreetPoints3D(self):
+        """Street points as tuples (x, y, z), a view of self.street_points built on first access."""
+        if self._listStreetPoints3D is None:
+            self._listStreetPoints3D = _tuples(self.street_points, self._street_points_int)
+        return self._listStreetPoints3D
+
+    @listStreetPoints3D.setter
+    def listStreetPoints3D(self, street_points):
+        self._listStreetPoints3D = list(street_points)
+        self.street_points, self._street_points_int = _rows_to_array(self._listStreetPoints3D, 3)
+
+    @property
+    def G(self):
+        """
+        Coverage graph with lidar and street point tuples as nodes. It is only a view of
+        self.coverage and is built on first access.
+        """
+        if self._G is None:
+            self._G = self.coverage_graph()
+        return self._G
+
+    @G.setter
+    def G(self, graph):
+        self._G = graph
+
+    def coverage_graph(self):
+        graph = nx.Graph()
+        graph.add_nodes_from(self.listLidar3D)
+        graph.add_nodes_from(self.listStreetPoints3D)
+        rows = np.repeat(np.arange(self.coverage.shape[0]), np.diff(self.coverage.indptr))
+        graph.add_edges_from(
+            (self.listStreetPoints3D[s], self.listLidar3D[l]) for s, l in zip(rows.tolist(), self.coverage.indices.tolist())
+        )
+        return graph
+
+    def graph_ids(self):
+        """
+        Ids of the street points and lidars that are nodes of G. Nodes removed from G
+        (e.g. by preprocessing) are missing, all ids are returned if G was never built.
+        """
+        if self._G is None:
+            return np.arange(len(self.listStreetPoints3D)), np.arange(len(self.listLidar3D))
+        street_point_ids = [i for i, s in enumerate(self.listStreetPoints3D) if s in self._G]
+        lidar_ids = [i for i, l in enumerate(self.listLidar3D) if l in self._G]
+        return np.array(street_point_ids, dtype=np.intp), np.array(lidar_ids, dtype=np.intp)
+
+    @property
+    def lidar_index(self):
+        """Id table {lidar tuple: lidar id} shared by models, solutions and evaluations."""
+        if self._lidar_index is None or len(self._lidar_index) != len(self.listLidar3D):
+            self._lidar_index = {l: i for i, l in enumerate(self.listLidar3D)}
+        return self._lidar_index
+
+    def lidar_key(self, lidar_id):
+        """Legacy solution key x_<x>_<y>_<z>_<yaw>_<pitch> of the lidar."""
+        l = self.listLidar3D[lidar_id]
+        return f"x_{l[0]}_{l[1]}_{l[2]}_{l[3]}_{l[4]}"
+
+    def lidars_of(self, street_point_id):
+        """Ids of the lidars covering the street point."""
+        return self.coverage.indices[self.coverage.indptr[street_point_id]:self.coverage.indptr[street_point_id + 1]]
 
     @classmethod
-    def gen_problem(cls, num_cols, version, rad_max= 2.5, hor_basic_distance = 1, vert_basic_dist = 2):
-        data_params = {
+    def gen_problem(cls, num_cols, version, rad_max= 2.5, hor_basic_distance = 1, vert_basic_dist = 2, workers = None, cache = None, tile_size = None):
+        problem_dict = cls.gen_problem_dict(num_cols, version, hor_basic_distance, vert_basic_dist)
+        if problem_dict is None:
+            return None
+        new_class = cls(**cls.gen_problem_params(rad_max))
+        new_class.create_graph_from_dict(problem_dict, workers=workers, cache=cache, tile_size=tile_size)
+        return new_class
+
+    @classmethod
+    def gen_problem_params(cls, rad_max = 2.5):
+        """Sensor parameters of the gen_problem instances."""
+        return {
             "vert_ang_max_deg": 30,
             "vert_ang_min_deg": -70,
             "halber_oeffnungswinkel_deg": 180,
             "rad_max": rad_max,
             "lidarwall_offset_m": 0.2
         }
+
+    @classmethod
+    def gen_problem_dict(cls, num_cols, version, hor_basic_distance = 1, vert_basic_dist = 2):
+        """Problem dict of the gen_problem instance, without coverage."""
         if version == 1:
-            return cls._gen_problem(num_cols, [0], 0, (num_cols-1)*hor_basic_distance, 2.5, 0,-10, 0, (num_cols-1)*hor_basic_distance, vert_basic_dist, vert_basic_dist, 1, num_cols, **data_params)
+            return cls.problem_generator(num_cols, [0], 0, (num_cols-1)*hor_basic_distance, 2.5, 0,-10, 0, (num_cols-1)*hor_basic_distance, vert_basic_dist, vert_basic_dist, 1, num_cols)
         elif version == 2:
-            return cls._gen_problem(num_cols, [0], 0, (num_cols-1)*hor_basic_distance, 2.5, 0, -10, 0, (num_cols-1)*hor_basic_distance, 0.5*vert_basic_dist, vert_basic_dist, 2, num_cols, **data_params)
+            return cls.problem_generator(num_cols, [0], 0, (num_cols-1)*hor_basic_distance, 2.5, 0, -10, 0, (num_cols-1)*hor_basic_distance, 0.5*vert_basic_dist, vert_basic_dist, 2, num_cols)
         elif version == 3:
-            return cls._gen_problem(num_cols, [0, 2*vert_basic_dist], 0, (num_cols-1)*hor_basic_distance, 2.5, 0, -10, 0, (num_cols-1)*hor_basic_distance, 0.5*vert_basic_dist, 1.5*vert_basic_dist, 3, num_cols, **data_params)
+            return cls.problem_generator(num_cols, [0, 2*vert_basic_dist], 0, (num_cols-1)*hor_basic_distance, 2.5, 0, -10, 0, (num_cols-1)*hor_basic_distance, 0.5*vert_basic_dist, 1.5*vert_basic_dist, 3, num_cols)
         else:
             print("Version can be ońly 1,2 or 3")
 
     @classmethod
-    def create_problem_from_glb_file(cls, lidar_density, street_point_density):
+    def create_problem_from_glb_file(cls, lidar_density, street_point_density, workers = None, cache = None, tile_size = None):
         problem_dict = create_problem_from_glb(lidar_density=lidar_density, street_point_density=street_point_density)
-        return cls.create_cls(problem_dict)
+        return cls.create_cls(problem_dict, workers=workers, cache=cache, tile_size=tile_size)
 
 
     @classmethod
     def create_graph_from_file(cls, path):
+        """Problem of a JSON file or of an instance directory written by save, relative to data/data."""
+        instance = Path(__file__).resolve().parent / 'data' / path
+        if (instance / "meta.json").exists():
+            return cls.load(instance)
         problem_dict = cls.__gimport(cls, path)
         return cls.create_cls(problem_dict)
 
@@ -80,32 +189,102 @@ class SPData:
         with open(path) as surrounding:
             return json.load(surrounding)
 
-    def create_graph_from_dict(self, problem_dict):
-        self.schemeGraph=problem_dict
-        self.walls3D = self.__generateWalls()
-        self.listLidar3D, self.listStreetPoints3D= self.__generateGraph3D()
-        self.create_connections()
+    def create_graph_from_dict(self, problem_dict, workers = None, cache = None, tile_size = None):
+        """
+        workers: number of processes for the coverage computation, None or 1 computes it
+        in this process. The result is the same for every value.
+        cache: optional CoverageCache, the coverage is loaded from it if the same problem
+        was computed before with the same sensor parameters.
+        tile_size: optional size of the square tiles the coverage is computed in, see create_connections.
+        """
+        with tracer.span("data.create_graph"):
+            with tracer.span("data.generate"):
+                self.schemeGraph=problem_dict
+                self.walls3D = self.__generateWalls()
+                self.__generateGraph3D()
+            self.create_connections(workers=workers, cache=cache, tile_size=tile_size)
 
     @classmethod
-    def create_cls(cls, problem_dict):
+    def create_cls(cls, problem_dict, workers = None, cache = None, tile_size = None):
         new_class = cls()
-        new_class.create_graph_from_dict(problem_dict)
+        new_class.create_graph_from_dict(problem_dict, workers=workers, cache=cache, tile_size=tile_size)
         return new_class
 
+    def save(self, path, coverage = True):
+        """
+        Writes the problem as instance directory: meta.json with the sensor parameters and
+        one .npy file per array (scheme, lidars and, with coverage=True, the CSR coverage and
+        the never covered street points), the layout of the entries of CoverageCache.
+        Entries given as int are marked in *_int masks, so load returns equal tuples and keys.
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        arrays = {}
+        _rows_to_arrays(arrays, "scheme_lidars", self.schemeGraph['listLidar'], 5, self.schemeGraph.get('listLidar_int'))
+        _rows_to_arrays(arrays, "scheme_street_points", self.schemeGraph['listCovering'], 2)
+        #wall rows may have fewer fields (e.g. without pitch), they are padded and their lengths stored
+        walls = [list(w[0]) + list(w[1]) + list(w[2:]) for w in self.schemeGraph['wall']]
+        width = max((len(w) for w in walls), default=10)
+        _rows_to_arrays(arrays, "walls", [w + [0.0] * (width - len(w)) for w in walls], width)
+        arrays["walls_len"] = np.array([len(w) for w in walls], dtype=np.int64)
+        _points_to_arrays(arrays, "lidars", self.lidars, self._lidars_int)
+        _points_to_arrays(arrays, "street_points", self.street_points, self._street_points_int)
+        if coverage:
+            arrays["indptr"] = self.coverage.indptr
+            arrays["indices"] = self.coverage.indices
+            arrays["never_covered"] = np.flatnonzero(np.diff(self.coverage.indptr) == 0)
+        for name, arr in arrays.items():
+            np.save(path / f"{name}.npy", np.ascontiguousarray(arr))
+        meta = {
+            "format": "sp-instance",
+            "version": self.instance_version,
+            "sensor_params": self.sensor_params(),
+            "arrays": sorted(arrays),
+            "coverage": coverage,
+        }
+        # meta.json is written last, an instance without it is incomplete
+        with open(path / "meta.json", "w") as f:
+            json.dump(meta, f, indent=1)
+
     @classmethod
-    def _gen_problem(cls, l_number_per_row, l_y, l_xmin, l_xmax, l_height, l_yaw_deg, l_pitch_deg, s_xmin, s_xmax, s_ymin, s_ymax, s_rows, s_cols, **data_params):
-        problem_dict = cls.problem_generator(l_number_per_row, l_y, l_xmin, l_xmax, l_height, l_yaw_deg, l_pitch_deg, s_xmin, s_xmax, s_ymin, s_ymax, s_rows, s_cols)
-        new_class = cls(**data_params)
-        new_class.create_graph_from_dict(problem_dict)
+    def load(cls, path, mmap = True, workers = None, cache = None, tile_size = None):
+        """
+        Reads an instance directory written by save. With mmap=True the arrays are memory-mapped
+        read-only, so the coverage is only read from disk on access and its pages are shared by
+        all processes loading the same instance. Without stored coverage it is computed.
+        """
+        with tracer.span("data.load", mmap=mmap):
+            path = Path(path)
+            with open(path / "meta.json") as f:
+                meta = json.load(f)
+            if meta.get("format") != "sp-instance" or meta.get("version") != cls.instance_version:
+                raise ValueError(f"{path} is no sp-instance of version {cls.instance_version}")
+            mmap_mode = "r" if mmap else None
+            arrays = {name: np.load(path / f"{name}.npy", mmap_mode=mmap_mode) for name in meta["arrays"]}
+
+            new_class = cls(**meta["sensor_params"])
+            walls = _arrays_to_rows(arrays, "walls")
+            if "walls_len" in arrays:
+                walls = [w[:n] for w, n in zip(walls, arrays["walls_len"].tolist())]
+            new_class.schemeGraph = {
+                'listLidar': _arrays_to_rows(arrays, "scheme_lidars"),
+                'listCovering': arrays["scheme_street_points"],
+                'wall': [[w[0:2], w[2:4]] + w[4:] for w in walls],
+            }
+            new_class.walls3D = new_class.__generateWalls()
+            new_class.__set_points(
+                arrays["lidars"], arrays.get("lidars_int"), arrays["street_points"], arrays.get("street_points_int")
+            )
+            if meta["coverage"]:
+                new_class.__set_coverage(arrays["lidars"], arrays["street_points"], arrays["indptr"], arrays["indices"])
+            else:
+                new_class.create_connections(workers=workers, cache=cache, tile_size=tile_size)
         return new_class
-    
 
     @classmethod
     def problem_generator(cls, l_number_per_row, l_y, l_xmin, l_xmax, l_height, l_yaw_deg, l_pitch_deg, s_xmin, s_xmax, s_ymin, s_ymax, s_rows, s_cols):
 
-        lid=[]
-        for i in l_y:
-            lid.extend(cls.create_horizontal_lidar_points(l_number_per_row, i, l_xmin, l_xmax, l_height, l_yaw_deg, l_pitch_deg))
+        lid=np.concatenate([cls.create_horizontal_lidar_points(l_number_per_row, i, l_xmin, l_xmax, l_height, l_yaw_deg, l_pitch_deg) for i in l_y]).reshape(-1, 5)
         
         str=cls.create_street_points(s_xmin, s_xmax, s_ymin, s_ymax, s_rows, s_cols)
         #Das sind 2 Wände mit Wandhöhe 3m
@@ -117,6 +296,10 @@ class SPData:
         #wal=[[[1,0],[1,1],3,0,0,0,0],[[0,0],[0,1],3,0,0,0,0]]
         wal=[]
         problem_dict={'listLidar':lid, 'listCovering':str, 'wall':wal}
+        #int height, yaw and pitch stay int in the lidar tuples and keys, as with the former lists
+        lid_int = _compact_int(np.array([[False, False] + [isinstance(v, (int, np.integer)) for v in (l_height, l_yaw_deg, l_pitch_deg)]]))
+        if lid_int is not None:
+            problem_dict['listLidar_int'] = lid_int
 
         #Damit kann man freistehende Lidare definieren, z.B. 2x41 Stück im Bereich -10m bis 10m in x-Richtung mit 2 verschiedenen y-Werten mit Höhe h und Winkel ang
 
@@ -125,130 +308,199 @@ class SPData:
 
     @classmethod
     def create_horizontal_lidar_points(cls, number, y, xmin, xmax, height, yaw_deg, pitch_deg): 
-        res=[]
-        x=[]
-        x.extend(np.linspace(xmin, xmax, number))
-        ytemp=[]
-        ytemp.extend(np.linspace(xmin, xmax, number)*0+ y)
-        pos=list(zip(x,ytemp))
-        for l in pos: 
-            res.append((l[0], l[1], height, yaw_deg, pitch_deg))
+        """
+        number lidars (x, y, height, yaw, pitch) evenly spaced from xmin to xmax as (number x 5) array.
+        problem_generator marks int height, yaw and pitch in the 'listLidar_int' column mask.
+        """
+        res = np.empty((number, 5))
+        res[:, 0] = np.linspace(xmin, xmax, number)
+        res[:, 1] = y
+        res[:, 2] = height
+        res[:, 3] = yaw_deg
+        res[:, 4] = pitch_deg
         return res
     
 
     #Damit kann man Straßenpunkte definieren, analog im Bereich -10m bis 10m in x-Richtung zwischen y1 und y2
     @classmethod
     def create_street_points(cls, xmin, xmax, ymin, ymax, rows, cols): 
-            res=[]
-            yloop=np.linspace(ymin,ymax,rows)
-            x=[]
-            for item in yloop:
-                y=np.linspace(xmin, xmax, cols)*0+ item
-                res.extend(y)
-                x.extend(np.linspace(xmin, xmax, cols))
-            return list(zip(x,res))
-
-    def create_connections(self): 
-        edgecount=0
-        for s in self.listStreetPoints3D:
-            nc=1
-            for l in self.listLidar3D:
-                line=(l,s)
-                if (self._in_range(l,s, self.rad_max, self.vert_ang_max_deg, self.vert_ang_min_deg, self.halber_oeffnungswinkel_deg)):
-                    inters=0
-                    for w in self.walls3D:
-                        inters+=self._intersect(line,w) 
-                        if inters: 
-                            break   
-                    if inters==0: 
-                        self.G.add_edge((s[0], s[1], s[2]),(l[0], l[1], l[2], l[3], l[4]))
-                        edgecount+=1
-                        nc=0
-            if nc:
-                self.listStreetPointsNeverCovered.append(s) 
+        """Grid of rows x cols street points (x, y) as array, row by row."""
+        x, y = np.meshgrid(np.linspace(xmin, xmax, cols), np.linspace(ymin, ymax, rows))
+        return np.column_stack((x.ravel(), y.ravel()))
+
+    def sensor_params(self):
+        return {
+            "vert_ang_max_deg": self.vert_ang_max_deg,
+            "vert_ang_min_deg": self.vert_ang_min_deg,
+            "rad_max": self.rad_max,
+            "halber_oeffnungswinkel_deg": self.halber_oeffnungswinkel_deg,
+            "lidarwall_offset_m": self.lidarwall_offset_m,
+        }
+
+    def create_connections(self, workers = None, cache = None, tile_size = None): 
+        """
+        Coverage matrix of the street points and lidars.
+        tile_size: if set, the scene is processed in square tiles of this size (in x/y) with a
+        halo of rad_max, so the memory of the intermediate arrays depends on the tile size.
+        The result is the same as without tiles.
+        """
+        with tracer.span("data.coverage", workers=workers, tile_size=tile_size):
+            if cache is not None:
+                key = cache.key(self.schemeGraph, self.sensor_params())
+                entry = cache.load(key)
+                if entry is not None and entry["indptr"].shape[0] == len(self.street_points) + 1:
+                    self.__set_coverage(entry["lidars"], entry["street_points"], entry["indptr"], entry["indices"])
+                    tracer.count("data.coverage_cache_hits")
+                    return
+
+            engine = CoverageEngine(
+                self.lidars, self.street_points, self.walls3D, self.rad_max, 
+                self.vert_ang_max_deg, self.vert_ang_min_deg, self.halber_oeffnungswinkel_deg
+            )
+            if tile_size is None:
+                s_idx, l_idx = engine.edges(workers=workers)
+                edges_per_point = np.bincount(s_idx, minlength=len(engine.points))
+                indptr = np.concatenate(([0], np.cumsum(edges_per_point)))
+                indices = l_idx.astype(np.int32)
+            else:
+                edges_per_point, indptr, indices = self.__tiled_coverage(engine, tile_size, workers)
+            self.__set_coverage(engine.lidars, engine.points, indptr, indices)
+
+            if cache is not None:
+                cache.store(
+                    key, lidars=self.lidars, street_points=self.street_points, indptr=indptr, indices=self.coverage.indices, 
+                    never_covered=np.flatnonzero(edges_per_point == 0)
+                )
+
+    @staticmethod
+    def __tiled_coverage(engine, tile_size, workers):
+        """Collects the edges of the tiles as int32 arrays and merges them into CSR form at the end."""
+        edges_per_point = np.zeros(len(engine.points), dtype=np.int64)
+        tiles = []
+        for s_idx, l_idx in engine.tiled_edges(tile_size, workers):
+            edges_per_point += np.bincount(s_idx, minlength=len(engine.points))
+            tiles.append((s_idx.astype(np.int32), l_idx.astype(np.int32)))
+
+        indptr = np.concatenate(([0], np.cumsum(edges_per_point)))
+        indices = np.zeros(indptr[-1], dtype=np.int32)
+        for s_idx, l_idx in tiles:
+            # the edges of a street point are contiguous and sorted by lidar within its tile
+            first = np.concatenate(([0], np.flatnonzero(np.diff(s_idx)) + 1))
+            rank = np.arange(len(s_idx)) - np.repeat(first, np.diff(np.append(first, len(s_idx))))
+            indices[indptr[s_idx] + rank] = l_idx
+        return edges_per_point, indptr, indices
+
+    def __set_coverage(self, lidars, street_points, indptr, indices):
+        self.lidars = lidars
+        self.street_points = street_points
+        self.coverage = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.int8), indices, indptr),
+            shape=(len(street_points), len(lidars))
+        )
+        self._G = None
+        self._lidar_index = None
+
+        never = np.flatnonzero(np.diff(indptr) == 0)
+        is_int = self._street_points_int
+        if is_int is not None and np.ndim(is_int) == 2:
+            is_int = is_int[never]
+        self.listStreetPointsNeverCovered = _tuples(street_points[never], is_int)
         self.never_covered=len(self.listStreetPointsNeverCovered) 
+        tracer.count("data.lidars", len(lidars))
+        tracer.count("data.street_points", len(street_points))
+        tracer.count("data.edges", len(indices))
+        tracer.count("data.never_covered", self.never_covered)
+
+    def __set_points(self, lidars, lidars_int, street_points, street_points_int):
+        self.lidars = lidars
+        self.street_points = street_points
+        self._lidars_int = lidars_int
+        self._street_points_int = street_points_int
+        self._listLidar3D = None
+        self._listStreetPoints3D = None
+        self._lidar_index = None
              
     def __generateGraph3D(self):
-        pointsL3D = []
-        pointsS3D = []
-        for i in self.schemeGraph['listLidar']:
-            pointsL3D.append((i[0], i[1], i[2], i[3], i[4]))
-        
+        lidars, lidars_int = _rows_to_array(self.schemeGraph['listLidar'], 5, self.schemeGraph.get('listLidar_int'))
+        wall_lidars, wall_lidars_int = self.__generateWallLidars()
+        if len(wall_lidars):
+            lidars_int = _concat_int(lidars_int, len(lidars), wall_lidars_int, len(wall_lidars), 5)
+            lidars = np.concatenate((lidars, wall_lidars))
+
+        covering, covering_int = _rows_to_array(self.schemeGraph['listCovering'], 2)
+        street_points = np.zeros((len(covering), 3))
+        street_points[:, 0:2] = covering
+        #z is the int 0
+        if covering_int is None:
+            street_points_int = np.array([False, False, True])
+        elif covering_int.ndim == 1:
+            street_points_int = np.append(covering_int, True)
+        else:
+            street_points_int = np.column_stack((covering_int, np.ones(len(covering_int), dtype=bool)))
+        self.__set_points(lidars, lidars_int, street_points, street_points_int)
+
+    def __generateWallLidars(self):
+        """ 
+        Lidars along the walls with lidar density > 0. A wall row is
+        [[x0, y0], [x1, y1], Wandhöhe m, Lidardichte/m, Lidarhöhe m, Lidarabstand m, Richtungsmodus, pitch].
+        The per wall values are computed in Python, the lidars of all walls at once.
+        Returns the (n x 5) lidar array and the mask of its int entries.
+        """
+        starts = []
+        steps = []
+        counts = []
+        angles = []
+        modes = []
+        heights = []
+        pitches = []
         for w in self.schemeGraph['wall']:
-            """ 
-            "wall": [   
-                
-                [
-                    [
-                        -3.0,
-                        0.0
-                    ],
-                    [
-                        3.0,
-                        1.0
-                    ]
-                ,
-                2,Wandhöhe m
-                3,Lidardichte/m
-                4, Lidarhöhe m
-                5,Lidarabstand m
-                6, Richtungsmodus
-                7, pitch]
-            ],
-            """    
-            if w[3]>0:
-                pitch=w[7]
-                #Verbindungsvektor Maueranfang zu Ende
-                diff=[w[1][0]-w[0][0], w[1][1]-w[0][1]]
-                #Länge der Mauer
-                length=math.sqrt(diff[0]**2+diff[1]**2)
-                #Abstandsvektor senkrecht zur Mauer
-                perpendicular_offset=[diff[1]*w[5]/length,-diff[0]*w[5]/length]
-                #Verbindungsvektor Lidarstrecke Anfang zu Ende, ist um 2*lidarwall_offset_m kürzer als diff
-                difflidar=[diff[0]*(1-2*self.lidarwall_offset_m/length),diff[1]*(1-2*self.lidarwall_offset_m/length)]
-                
-                difflidarlength=math.sqrt(difflidar[0]**2+difflidar[1]**2)
-                #Anzahl der zu plazierenden Lidare
-                #Reale Lidardichte soll höchstens die vorgegebene sein
-                numlid=int(np.floor(difflidarlength*w[3]))
-                #Mindestens 1 Lidar setzen
-                if numlid <=1: 
-                    numlid=1
-            
-
-                difflidarstart=[w[0][0]+self.lidarwall_offset_m/length*diff[0]+perpendicular_offset[0], w[0][1]+self.lidarwall_offset_m/length*diff[1]+perpendicular_offset[1]]
-                if numlid>1:
-                    for i in range(0, numlid):   
-                        #numlid lidare werden gesetzt                    
-                        lx=difflidarstart[0]+i/(numlid-1)*difflidar[0]
-                        ly=difflidarstart[1]+i/(numlid-1)*difflidar[1]
-                        lz=w[4]
-                        ang=90-math.atan2(perpendicular_offset[1], perpendicular_offset[0])*180/math.pi
-                        if w[6]>0: 
-                            #Alternating mode
-                            ang+=((i+w[6])%2-0.5)*2*(90-self.halber_oeffnungswinkel_deg)
-                        #Neues Mauerradar hinzufügen
-                        pointsL3D.append((lx,ly,lz, ang, pitch))
-                else: 
-                    #numlid=1
-                    # ein Lidar in der Mitte
-                    lx=w[0][0]+diff[0]*0.5+perpendicular_offset[0]
-                    ly=w[0][1]+diff[1]*0.5+perpendicular_offset[1]
-                    lz=w[4]
-                    ang=90-math.atan2(perpendicular_offset[1], perpendicular_offset[0])*180/math.pi
-                    if w[6]>0: 
-                        #Alternating mode
-                        ang+=((i+w[6])%2-0.5)*2*(90-self.halber_oeffnungswinkel_deg)
-                    #Neues Mauerradar hinzufügen
-                    pointsL3D.append((lx,ly,lz, ang, pitch))
-                
-        for i in self.schemeGraph['listCovering']:
-            pointsS3D.append((i[0], i[1], 0))
-            
-        self.G.add_nodes_from(pointsL3D)
-        self.G.add_nodes_from(pointsS3D)
-
-        return pointsL3D, pointsS3D
+            if not w[3] > 0:
+                continue
+            #Verbindungsvektor Maueranfang zu Ende
+            diff=[w[1][0]-w[0][0], w[1][1]-w[0][1]]
+            #Länge der Mauer
+            length=math.sqrt(diff[0]**2+diff[1]**2)
+            #Abstandsvektor senkrecht zur Mauer
+            perpendicular_offset=[diff[1]*w[5]/length,-diff[0]*w[5]/length]
+            #Verbindungsvektor Lidarstrecke Anfang zu Ende, ist um 2*lidarwall_offset_m kürzer als diff
+            difflidar=[diff[0]*(1-2*self.lidarwall_offset_m/length),diff[1]*(1-2*self.lidarwall_offset_m/length)]
+            difflidarlength=math.sqrt(difflidar[0]**2+difflidar[1]**2)
+            #Anzahl der zu plazierenden Lidare, reale Lidardichte soll höchstens die vorgegebene sein, mindestens 1
+            numlid=max(int(np.floor(difflidarlength*w[3])), 1)
+            if numlid>1:
+                starts.append([w[0][0]+self.lidarwall_offset_m/length*diff[0]+perpendicular_offset[0], w[0][1]+self.lidarwall_offset_m/length*diff[1]+perpendicular_offset[1]])
+            else:
+                # ein Lidar in der Mitte
+                starts.append([w[0][0]+diff[0]*0.5+perpendicular_offset[0], w[0][1]+diff[1]*0.5+perpendicular_offset[1]])
+            steps.append(difflidar)
+            counts.append(numlid)
+            angles.append(90-math.atan2(perpendicular_offset[1], perpendicular_offset[0])*180/math.pi)
+            modes.append(w[6])
+            heights.append(w[4])
+            pitches.append(w[7])
+
+        counts = np.array(counts, dtype=np.int64)
+        wall = np.repeat(np.arange(len(counts)), counts)
+        #index i of the lidar on its wall
+        i = np.arange(len(wall)) - np.repeat(np.cumsum(counts) - counts, counts)
+        n = counts[wall]
+        starts = np.array(starts, dtype=float).reshape(-1, 2)[wall]
+        steps = np.array(steps, dtype=float).reshape(-1, 2)[wall]
+        fraction = (i / np.maximum(n - 1, 1))[:, None]
+        #numlid lidare werden gleichmäßig gesetzt
+        position = np.where((n > 1)[:, None], starts + fraction * steps, starts)
+
+        angle = np.array(angles, dtype=float)[wall]
+        mode = np.array(modes, dtype=float)[wall]
+        #Alternating mode
+        alternating = angle + ((i + mode) % 2 - 0.5) * 2 * (90 - self.halber_oeffnungswinkel_deg)
+        angle = np.where(mode > 0, alternating, angle)
+
+        lidars = np.column_stack((position, np.array(heights, dtype=float)[wall], angle, np.array(pitches, dtype=float)[wall]))
+        is_int = np.zeros((len(lidars), 5), dtype=bool)
+        is_int[:, 2] = np.array([isinstance(v, (int, np.integer)) for v in heights], dtype=bool)[wall]
+        is_int[:, 4] = np.array([isinstance(v, (int, np.integer)) for v in pitches], dtype=bool)[wall]
+        return lidars.reshape(-1, 5), _compact_int(is_int)
 
     def __generateWalls(self):
         walls=[]
@@ -264,73 +516,67 @@ class SPData:
     
     @classmethod
     def _in_range(cls, l,s, maxcoverage_meter, vert_ang_max_deg, vert_ang_min_deg, halber_oeffnungswinkel_deg):
-        too_far=math.sqrt((s[0]-l[0])**2+   (s[1]-l[1])**2)>maxcoverage_meter
-        if too_far: 
-            return 0
-        
-        #relative orientation of street point in the system of the lidar with yaw and pitch
-        
-        #angle convention north/clockwise transformed to mathematical angle convention
-        ya=(90-l[3])/180*math.pi
-        #rotation matrix for yaw
-        #if yaw positive (counterclockwise), relative movement of streetpoint is clockwise
-        y=np.array([[math.cos(ya), math.sin(ya), 0], 
-           [-math.sin(ya), math.cos(ya), 0],
-           [0,0,1]
-           ])
-        
-        pitch_angle=l[4]/180*math.pi
-        #if pitch of lidar upwards, streetpoint is moving downwards
-        p=np.array([[math.cos(pitch_angle), 0, math.sin(pitch_angle)], 
-           [0, 1, 0],
-           [-math.sin(pitch_angle), 0, math.cos(pitch_angle)]
-           ])
-        total_rotation=np.matmul(p,y)
-        la=np.array(l[0:3])
-        sa=np.array(s)
-        
-      
-        rel_rotated=np.matmul(total_rotation, sa-la)
-        
-        #decision if streetpoint in vertical FoV
-        vert_angle=math.atan2(rel_rotated[2], math.sqrt(rel_rotated[0]**2+rel_rotated[1]**2))
-        if vert_angle>vert_ang_max_deg/180*math.pi or vert_angle<vert_ang_min_deg/180*math.pi: 
-            return 0
-        
-        #decision if streetpoint in horizontal FoV
-        hor_angle=math.atan2(rel_rotated[1], rel_rotated[0])
-        if math.fabs(hor_angle)>halber_oeffnungswinkel_deg/180*math.pi: 
-            return 0
-       
-        return 1
+        return in_range(l, s, maxcoverage_meter, vert_ang_max_deg, vert_ang_min_deg, halber_oeffnungswinkel_deg)
 
     @classmethod
     def _intersect(cls, line, w):
-        
-        a=line[1][0]-line[0][0]
-        b=w[0][0]-w[1][0]
-        c=line[1][1]-line[0][1]
-        d=w[0][1]-w[1][1]
-        det=a*d-b*c
-        if det==0: 
-            return 0
-        line_s=line[0]
-        lidarh=line_s[2]
-        mauerh=w[2]
-        if mauerh==0: 
-            return 0
-        ws=w[0] #eckige Klammer ist Liste ist Vektor
-        diff=[ws[i]-line_s[i] for i in range(len(ws))]
-        im=1.0/det*np.array([[d,-b],[-c,a]])
-        r=np.dot(im,diff)
-        if not (r[0]>0 and r[0]<1 and r[1]>0 and r[1]<1): 
-            return 0
-
-        #r[0] Anteil zwischen Lidar und Mauer vergl. zu Lidar und Straßenpunkt, wenn in line erst das lidar kommt
-        if lidarh/mauerh>=1/(1-r[0]): 
-            return 0
-        else: 
-            return 1
-
-
-
+        return intersect(line, w)
+
+
+def _rows_to_array(rows, width, is_int = None):
+    """
+    Float array of rows and the mask of their int entries (None if there are none, a column
+    mask if it is the same for all rows). Arrays are taken as they are, with the mask is_int.
+    """
+    if isinstance(rows, np.ndarray):
+        return rows.reshape(-1, width)[:, 0:width].astype(float, copy=False), is_int
+    array = np.array([row[0:width] for row in rows], dtype=float).reshape(-1, width)
+    is_int = np.array([[isinstance(v, (int, np.integer)) for v in row[0:width]] for row in rows], dtype=bool).reshape(-1, width)
+    return array, _compact_int(is_int)
+
+
+def _compact_int(is_int):
+    if not is_int.any():
+        return None
+    if (is_int == is_int[0]).all():
+        return is_int[0].copy()
+    return is_int
+
+
+def _concat_int(first, n_first, second, n_second, width):
+    """Int mask of two stacked arrays with the masks first and second."""
+    if first is None and second is None:
+        return None
+    masks = [np.broadcast_to(np.zeros(width, dtype=bool) if m is None else m, (n, width)) for m, n in ((first, n_first), (second, n_second))]
+    return _compact_int(np.concatenate(masks))
+
+
+def _tuples(array, is_int):
+    """Rows of array as tuples of Python numbers, the entries marked in is_int as int."""
+    array = np.asarray(array)
+    if is_int is None:
+        return list(map(tuple, array.tolist()))
+    is_int = np.asarray(is_int)
+    if is_int.ndim == 1:
+        columns = [array[:, c].astype(np.int64).tolist() if is_int[c] else array[:, c].tolist() for c in range(array.shape[1])]
+        return list(zip(*columns))
+    rows = array.tolist()
+    for r, c in np.argwhere(is_int).tolist():
+        rows[r][c] = int(rows[r][c])
+    return list(map(tuple, rows))
+
+
+def _points_to_arrays(arrays, name, points, is_int):
+    arrays[name] = points
+    if is_int is not None:
+        arrays[name + "_int"] = is_int
+
+
+def _rows_to_arrays(arrays, name, rows, width, is_int = None):
+    """Stores rows as float array name and, if some entries are int, their mask as name_int."""
+    _points_to_arrays(arrays, name, *_rows_to_array(rows, width, is_int))
+
+
+def _arrays_to_rows(arrays, name):
+    """Rows of the float array name as lists, with the entries marked in name_int as int."""
+    return [list(row) for row in _tuples(arrays[name], arrays.get(name + "_int"))]
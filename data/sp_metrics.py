@@ -0,0 +1,188 @@
+import cProfile
+import io
+import json
+import pstats
+import time
+import tracemalloc
+
+from contextlib import nullcontext
+
+
+class Tracer:
+    """
+    Collects nested stage spans with durations, counters and optionally the peak memory
+    (tracemalloc) and a cProfile of the spans.
+
+    SPData, SPQuboBinary, SPCplex and SPEvaluation report to the module instance `tracer`.
+    It is disabled by default; a disabled tracer returns a shared no-op context from span()
+    and ignores count(), so the instrumentation costs one attribute check per call.
+
+        tracer.enable(memory=True)
+        data = SPData.gen_problem(40, 3)
+        model = SPQuboBinary(data, process=True)
+        tracer.to_json("trace.json")
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self.profile = False
+        self.profile_lines = 25
+        self.__started_tracemalloc = False
+        self.reset()
+
+    def enable(self, memory = False, profile = False, profile_lines = 25):
+        """
+        memory: record the peak traced memory of every span (tracemalloc slows down the code).
+        profile: True to profile the outermost spans with cProfile, or the names of the spans
+        to profile. Only one profiler can run at a time, spans inside a profiled span are part
+        of its profile. The statistics are in self.profiles, a summary of profile_lines lines
+        is exported with the span.
+        """
+        self.enabled = True
+        self.memory = memory
+        self.profile = profile if profile is True or profile is False else frozenset(profile)
+        self.profile_lines = profile_lines
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.__started_tracemalloc = True
+        return self
+
+    def disable(self):
+        self.enabled = False
+        if self.__started_tracemalloc:
+            tracemalloc.stop()
+            self.__started_tracemalloc = False
+        return self
+
+    def reset(self):
+        """Drops all recorded spans, counters and profiles."""
+        self.spans = []
+        self.counters = {}
+        self.profiles = []
+        self.__stack = []
+        self.__origin = time.perf_counter()
+
+    def span(self, name, **attrs):
+        """Context manager timing the stage name; attrs are stored with the span."""
+        if not self.enabled:
+            return _null_span
+        return _Span(self, name, attrs)
+
+    def count(self, name, value = 1):
+        """Adds value to the counter name, in total and in the innermost open span."""
+        if not self.enabled:
+            return
+        if hasattr(value, "item"):
+            value = value.item()
+        self.counters[name] = self.counters.get(name, 0) + value
+        if self.__stack:
+            counters = self.__stack[-1].record["counters"]
+            counters[name] = counters.get(name, 0) + value
+
+    def stages(self):
+        """Spans aggregated by name: calls, total and maximum duration, maximum memory peak."""
+        res = {}
+        todo = list(self.spans)
+        while todo:
+            record = todo.pop()
+            todo.extend(record["children"])
+            stage = res.setdefault(record["name"], {"calls": 0, "total": 0.0, "max": 0.0})
+            stage["calls"] += 1
+            stage["total"] += record["duration"]
+            stage["max"] = max(stage["max"], record["duration"])
+            if "memory_peak" in record:
+                stage["memory_peak"] = max(stage.get("memory_peak", 0), record["memory_peak"])
+        return res
+
+    def to_dict(self):
+        return {"spans": self.spans, "counters": dict(self.counters), "stages": self.stages()}
+
+    def to_json(self, path = None, **kwargs):
+        """The recorded data as JSON string, written to path if given."""
+        text = json.dumps(self.to_dict(), default=_json_default, **kwargs)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+    def _enter(self, span):
+        record = span.record
+        record["start"] = time.perf_counter() - self.__origin
+        (self.__stack[-1].record["children"] if self.__stack else self.spans).append(record)
+        if self.memory and tracemalloc.is_tracing():
+            self.__fold_peak()
+            span.memory_start = tracemalloc.get_traced_memory()[0]
+            span.memory_peak = span.memory_start
+        self.__stack.append(span)
+        if self.__profiled(span):
+            span.profiler = cProfile.Profile()
+            span.profiler.enable()
+        span.start = time.perf_counter()
+
+    def _exit(self, span):
+        end = time.perf_counter()
+        record = span.record
+        record["duration"] = end - span.start
+        if span.profiler is not None:
+            span.profiler.disable()
+            self.profiles.append((record["name"], span.profiler))
+            record["profile"] = _profile_summary(span.profiler, self.profile_lines)
+        if span.memory_start is not None and tracemalloc.is_tracing():
+            self.__fold_peak()
+            record["memory_peak"] = span.memory_peak - span.memory_start
+        self.__stack.pop()
+
+    def __profiled(self, span):
+        if self.profile is False or any(s.profiler is not None for s in self.__stack[:-1]):
+            return False
+        if self.profile is True:
+            return len(self.__stack) == 1
+        return span.record["name"] in self.profile
+
+    def __fold_peak(self):
+        """Adds the peak since the last call to all open spans, so nested spans can reset it."""
+        peak = tracemalloc.get_traced_memory()[1]
+        for open_span in self.__stack:
+            if open_span.memory_start is not None:
+                open_span.memory_peak = max(open_span.memory_peak, peak)
+        tracemalloc.reset_peak()
+
+
+class _Span:
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.record = {"name": name, "attrs": attrs, "counters": {}, "children": []}
+        self.start = None
+        self.memory_start = None
+        self.memory_peak = None
+        self.profiler = None
+
+    def __enter__(self):
+        self.tracer._enter(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer._exit(self)
+        return False
+
+
+_null_span = nullcontext()
+
+
+def _profile_summary(profiler, lines):
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(lines)
+    return out.getvalue()
+
+
+def _json_default(obj):
+    # numpy scalars in attrs and counters
+    if hasattr(obj, "item"):
+        return obj.item()
+    return str(obj)
+
+
+#instance all modules report to
+tracer = Tracer()
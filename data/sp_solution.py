@@ -0,0 +1,75 @@
+import numpy as np
+
+from collections.abc import MutableMapping
+
+
+class SPSolution(MutableMapping):
+    """
+    Solution of a sensor positioning problem as boolean array over the lidar ids of data
+    (index in data.listLidar3D).
+
+    For compatibility it behaves like the legacy solution dict {"x_<x>_<y>_<z>_<yaw>_<pitch>": 0/1}
+    over all lidars. Items can also be read and set with the lidar tuple or the lidar id as key;
+    the legacy string keys are only formatted when the solution is iterated.
+    """
+
+    def __init__(self, data, activated = None):
+        self.data = data
+        if activated is None:
+            activated = np.zeros(len(data.listLidar3D), dtype=bool)
+        self.activated = np.asarray(activated, dtype=bool)
+        self._keys = None
+
+    @classmethod
+    def from_dict(cls, data, solution_dict):
+        """Solution of a legacy dict with string or lidar tuple keys."""
+        res = cls(data)
+        for key, value in solution_dict.items():
+            res[key] = value
+        return res
+
+    def ids(self):
+        return np.flatnonzero(self.activated)
+
+    def lidars(self):
+        return [self.data.listLidar3D[i] for i in self.ids().tolist()]
+
+    def objective(self):
+        return int(np.count_nonzero(self.activated))
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __id(self, key):
+        if isinstance(key, (int, np.integer)):
+            return int(key)
+        if isinstance(key, str):
+            if key in self.__key_ids():
+                return self.__key_ids()[key]
+            parts = key.split('_')
+            key = tuple(float(p.replace("m", "-")) for p in parts[1:6])
+        return self.data.lidar_index[key]
+
+    def __key_ids(self):
+        """Legacy string keys {key: lidar id}, formatted on first use."""
+        if self._keys is None or len(self._keys) != len(self.activated):
+            self._keys = {self.data.lidar_key(i): i for i in range(len(self.activated))}
+        return self._keys
+
+    def __getitem__(self, key):
+        return np.int8(self.activated[self.__id(key)])
+
+    def __setitem__(self, key, value):
+        self.activated[self.__id(key)] = value == 1
+
+    def __delitem__(self, key):
+        raise TypeError("lidars cannot be removed from a SPSolution")
+
+    def __iter__(self):
+        return iter(self.__key_ids())
+
+    def __len__(self):
+        return len(self.activated)
+
+    def __repr__(self):
+        return f"SPSolution({self.objective()} of {len(self.activated)} lidars activated)"
@@ -1,23 +1,39 @@
-from copy import deepcopy
+import numpy as np
+
+from data.sp_coverage import CoverageEngine
+from data.sp_metrics import tracer
+from data.sp_solution import SPSolution
+from models.sp_qubo_binary import qubo_state
 
 class SPEvaluation():
 
-    def __init__(self, data, solution):
+    def __init__(self, data, solution, use_coverage = True):
+        """
+        use_coverage: check the coverage with the coverage matrix of data (one sparse matrix-vector
+        product) instead of recomputing the geometry. Lidars of the solution that are not in
+        data.listLidar3D fall back to the geometric check. The graph O for plotting is only
+        built when it is accessed.
+        """
         self.data = data
         self.solution = solution
+        self.use_coverage = use_coverage
 
-        self.O = deepcopy(self.data.O)
-        self.schemeGraph = deepcopy(self.data.schemeGraph)
+        self.schemeGraph = self.data.schemeGraph
         self.missing_achievable_coverage = self.data.missing_achievable_coverage
 
         self.listLidarActivated=[]
         self.listStreetPointsCovered=[]
+        self._O = None
+        self.__edges = None
 
-        self.create_solution_graph(solution)
-        self.create_optimized_connections()
+        with tracer.span("evaluation", use_coverage=use_coverage):
+            self.create_solution_graph(solution)
+            self.create_optimized_connections()
 
         self.objective = len(self.listLidarActivated)
         self.never_covered = self.data.never_covered
+        tracer.count("evaluation.activated_lidars", self.objective)
+        tracer.count("evaluation.missing_achievable_coverage", self.missing_achievable_coverage)
 
     def print_evaluation(self):
         print(f"{self.objective} Lidars activated.")
@@ -33,6 +49,9 @@ class SPEvaluation():
         return error
     
     def create_solution_graph(self, solution_dict):
+        if isinstance(solution_dict, SPSolution) and solution_dict.data is self.data:
+            self.listLidarActivated = solution_dict.lidars()
+            return
         for key, value in solution_dict.items():
             if value==1:
                 parts = key.split('_')
@@ -42,7 +61,14 @@ class SPEvaluation():
                 dir=float(parts[4].replace("m","-"))
                 pitch=float(parts[5].replace("m","-"))
                 self.listLidarActivated.append((lx,ly,lz, dir, pitch))
-        self.__generateOptimizedGraph()
+
+    @property
+    def O(self):
+        if self._O is None:
+            self._O = self.data.O.copy()
+            self.__generateOptimizedGraph()
+            self.__add_optimized_edges()
+        return self._O
 
     def __generateOptimizedGraph(self):
        
@@ -50,29 +76,117 @@ class SPEvaluation():
          
         for i in self.schemeGraph['listCovering']:
             points3.append((i[0], i[1]))
-        self.O.add_nodes_from(self.listLidarActivated)
-        self.O.add_nodes_from(points3)
+        self._O.add_nodes_from(self.listLidarActivated)
+        self._O.add_nodes_from(points3)
 
+    def __activated_ids(self):
+        """Ids of the activated lidars in data.listLidar3D, None if one of them is not there."""
+        if isinstance(self.solution, SPSolution) and self.solution.data is self.data:
+            return self.solution.ids()
+        index = self.data.lidar_index
+        ids = [index.get(l) for l in self.listLidarActivated]
+        if any(i is None for i in ids):
+            return None
+        return np.array(ids, dtype=np.intp)
 
-    def create_optimized_connections(self): 
+    def __coverage_edges(self):
+        """(street point ids, positions in listLidarActivated) of the coverage edges, sorted by street point."""
+        if self.__edges is None:
+            ids = self.__activated_ids() if self.use_coverage else None
+            if ids is not None:
+                sub = self.data.coverage[:, ids].tocsr()
+                sub.sort_indices()
+                self.__edges = np.repeat(np.arange(sub.shape[0]), np.diff(sub.indptr)), sub.indices
+            else:
+                engine = CoverageEngine(
+                    self.listLidarActivated, self.data.listStreetPoints3D, self.data.walls3D, self.data.rad_max, 
+                    self.data.vert_ang_max_deg, self.data.vert_ang_min_deg, self.data.halber_oeffnungswinkel_deg
+                )
+                self.__edges = engine.edges()
+        return self.__edges
+
+    def __add_optimized_edges(self):
+        s_idx, l_idx = self.__coverage_edges()
+        edges_per_point = np.bincount(s_idx, minlength=len(self.data.listStreetPoints3D))
 
-        for s in self.data.listStreetPoints3D:
-            not_covered=True
-            for l in self.listLidarActivated:
-                line=(l,s)
-                
-                if (self.data._in_range(l,s, self.data.rad_max, self.data.vert_ang_max_deg, self.data.vert_ang_min_deg, self.data.halber_oeffnungswinkel_deg)):
-                    inters=0
-                    for w in self.data.walls3D:
-                        inters+=self.data._intersect(line,w) 
-                        if inters>0: 
-                            break   
-                    if inters==0: 
-                        self.O.add_edge((s[0], s[1]),(l[0], l[1]))
-                        not_covered=False
-            if not_covered:
-                self.O.remove_node((s[0], s[1]))
-            else: 
-                self.listStreetPointsCovered.append((s[0], s[1]))
+        pos = 0
+        for s, num_edges in zip(self.data.listStreetPoints3D, edges_per_point.tolist()):
+            for l in l_idx[pos:pos + num_edges].tolist():
+                l = self.listLidarActivated[l]
+                self._O.add_edge((s[0], s[1]),(l[0], l[1]))
+            pos += num_edges
+            if num_edges == 0:
+                self._O.remove_node((s[0], s[1]))
+
+
+    def create_optimized_connections(self): 
+        ids = self.__activated_ids() if self.use_coverage else None
+        if ids is not None:
+            activated = np.zeros(len(self.data.listLidar3D), dtype=np.int32)
+            activated[ids] = 1
+            covered = self.data.coverage @ activated > 0
+        else:
+            s_idx, _ = self.__coverage_edges()
+            covered = np.bincount(s_idx, minlength=len(self.data.listStreetPoints3D)) > 0
+        self.listStreetPointsCovered = [(s[0], s[1]) for s, c in zip(self.data.listStreetPoints3D, covered.tolist()) if c]
         self.missing_achievable_coverage=len(self.data.listStreetPoints3D)-len(self.listStreetPointsCovered)-len(self.data.listStreetPointsNeverCovered)
 
+
+class SPBatchEvaluation():
+    """
+    Evaluates many solutions of one problem at once with sparse matrix products.
+
+    model: optional QuboSPBinary of data, needed for SampleSets and QUBO energies.
+    """
+
+    def __init__(self, data, model = None):
+        self.data = data
+        self.model = model
+        self.lidar_index = self.data.lidar_index
+        self.coverable = np.diff(self.data.coverage.indptr) > 0
+
+    def lidar_ids(self, lidars):
+        return np.array([self.lidar_index[l] for l in lidars], dtype=np.intp)
+
+    def solutions_to_array(self, solutions):
+        """(solutions x listLidar3D) 0/1 array of solution dicts with keys x_<x>_<y>_<z>_<yaw>_<pitch>."""
+        res = np.zeros((len(solutions), len(self.data.listLidar3D)), dtype=np.int8)
+        for row, solution in zip(res, solutions):
+            for key, value in solution.items():
+                if value == 1:
+                    parts = key.split('_')
+                    row[self.lidar_index[tuple(float(p.replace("m", "-")) for p in parts[1:6])]] = 1
+        return res
+
+    def evaluate(self, solutions):
+        """
+        solutions: (solutions x listLidar3D) 0/1 array, list of SPSolutions or solution dicts or a SampleSet
+        of self.model.
+        Returns arrays with the objective, the missing achievable coverage and the QUBO energy
+        (None without model) of every solution. For a SampleSet the preprocessing decisions of the
+        model are applied; for lidar arrays the energy is the one with consistent slack bits.
+        """
+        with tracer.span("evaluation.batch"):
+            energy = None
+            if hasattr(solutions, "record"):
+                states = self.model.qubo_samples(solutions)
+                energy = self.model.energies(states)
+                lidars = np.zeros((len(states), len(self.data.listLidar3D)), dtype=np.int8)
+                lidars[:, self.model.lidar_ids] = states[:, :len(self.model.lidar_ids)]
+                lidars[:, self.lidar_ids(self.model.radar1)] = 1
+            else:
+                if len(solutions) and isinstance(solutions[0], SPSolution):
+                    solutions = np.array([solution.activated for solution in solutions])
+                elif len(solutions) and isinstance(solutions[0], dict):
+                    solutions = self.solutions_to_array(solutions)
+                lidars = np.atleast_2d(np.asarray(solutions, dtype=np.int8))
+                if self.model is not None:
+                    energy = self.model.energies(qubo_state(self.model.incidence, lidars[:, self.model.lidar_ids]))
+
+            covered = (self.data.coverage @ lidars.T.astype(np.int32)) > 0
+            tracer.count("evaluation.batch_solutions", len(lidars))
+        return {
+            "objective": lidars.sum(axis=1),
+            "missing_achievable_coverage": np.count_nonzero(~covered & self.coverable[:, None], axis=0),
+            "energy": energy,
+        }
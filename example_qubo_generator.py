@@ -5,13 +5,12 @@ from models import SPQuboBinary
 from evaluation.evaluation import SPEvaluation
 from plotting.sp_plot import SPPlot
 import networkx as nx
-import copy
 
 
 params =    {"version": 3, "num_cols": 43, "rad_max": 2.8}
 #{"version": 3, "num_cols": 4, "rad_max": 3.2}
+# SPQuboBinary does not change data, so the same data is used for both models and the plots
 data = SPData().gen_problem(**params) 
-data_copy = copy.deepcopy(data)
 plt = SPPlot(data).plot_problem()
 plt.show()
 
@@ -36,7 +35,7 @@ for constraint, violations in evaluation_no_process.check_solution().items():
     if len(violations) > 0:
         print(f"constraint {constraint} was violated {len(violations)} times")
 
-plt = SPPlot(data_copy, evaluation_no_process).plot_solution(hide_never_covered=True)
+plt = SPPlot(data, evaluation_no_process).plot_solution(hide_never_covered=True)
 plt.show()
 
 # Solution with data processing 
@@ -46,21 +45,7 @@ qubo_model_bin_process = SPQuboBinary(data, process=True)
 print("Shape of the QUBO matrix with process=True:", qubo_model_bin_process.model.shape)
 
 answer_True_process = qubo_model_bin_process.solve(solve_func, **config) #This is the solution for the reduced Q
-for key in qubo_model_bin_process.radar0: #We are readding the trivial terms 
-    answer_True_process['solution'][key] = np.int8(0) 
-for key in qubo_model_bin_process.radar1:
-    answer_True_process['solution'][key] = np.int8(1) #We are readding the trivial terms
-
-
-def convert_keys_to_strings(solution): # To have some proper solution shape
-    new_solution = {}
-    for key, value in solution.items():
-        if isinstance(key, tuple):  # Vérifie si la clé est un tuple
-            # Convertit le tuple en une chaîne de caractères (par exemple, 'x_0.0_0.0_2.5_0_-10')
-            key = 'x_' + '_'.join(map(str, key))
-        new_solution[key] = value
-    return new_solution
-answer_True_process['solution'] = solution_process_str_keys = convert_keys_to_strings(answer_True_process['solution'])
+qubo_model_bin_process.merge_decisions(answer_True_process['solution']) #We are readding the trivial terms (radar0, radar1)
 evaluation_process = SPEvaluation(data, answer_True_process['solution'])
 
 
@@ -71,7 +56,7 @@ for constraint, violations in evaluation_process.check_solution().items():
     if len(violations) > 0:
         print(f"constraint {constraint} was violated {len(violations)} times") #Print the conditions that were violated
 
-plt = SPPlot(data_copy, evaluation_process).plot_solution(hide_never_covered=True)
+plt = SPPlot(data, evaluation_process).plot_solution(hide_never_covered=True)
 plt.show()
 
 # Compare the two answers
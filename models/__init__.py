@@ -5,8 +5,12 @@ sys.path.insert(0, parent_dir)
 
 from .sp_cplex import CPlexSP as SPCplex
 from .sp_qubo_binary import QuboSPBinary as SPQuboBinary
+from .sp_annealing import AnnealerSP as SPAnnealer
+from .sp_greedy import GreedySP as SPGreedy
 
 __all__ = [
     "SPCplex",
     "SPQuboBinary",
+    "SPAnnealer",
+    "SPGreedy",
 ]
\ No newline at end of file
@@ -0,0 +1,149 @@
+import math
+import time
+import numpy as np
+
+from scipy import sparse as sp
+
+
+class AnnealerSP:
+    """
+    Simulated annealing for sparse QUBOs which advances all reads together.
+
+    The states of all reads are the columns of a (variables x reads) matrix. The variables
+    are split into colour classes of the interaction graph, variables of one class do not
+    interact, so a whole class is updated at once with the Metropolis rule from the local
+    fields, which are kept up to date incrementally after every class.
+
+    sample_qubo has the interface of neal.SimulatedAnnealingSampler.sample_qubo and returns
+    a dimod.SampleSet, so it can be used as solve_func of SPQuboBinary.solve.
+    """
+
+    def sample_qubo(self, Q, num_reads=10, num_sweeps=1000, beta_range=None, beta_schedule_type="geometric",
+                    beta_schedule=None, seed=None, initial_states=None):
+        """
+        Q: dict {(i, j): coefficient}, dense array or scipy sparse matrix.
+        beta_range: (hot, cold) inverse temperatures, by default derived from the coefficients.
+        beta_schedule_type: "geometric" or "linear" interpolation of beta_range over num_sweeps.
+        beta_schedule: explicit inverse temperature per sweep, replaces beta_range and the type.
+        initial_states: (reads x variables) array of 0/1, random states by default.
+        """
+        import dimod
+
+        start_time = time.perf_counter()
+        labels, h, J = self.__coupling(Q)
+        num_vars = len(h)
+        rng = np.random.default_rng(seed)
+
+        if beta_schedule is None:
+            if beta_range is None:
+                beta_range = default_beta_range(h, J)
+            beta_schedule = beta_schedule_of(beta_range, num_sweeps, beta_schedule_type)
+        beta_schedule = np.asarray(beta_schedule, dtype=np.float64)
+
+        # variables of one colour class are stored next to each other, a class is a slice
+        classes = colour_classes(J)
+        order = np.concatenate(classes) if classes else np.zeros(0, dtype=np.intp)
+        bounds = np.cumsum([0] + [len(c) for c in classes]).tolist()
+        J = J[order][:, order].tocsr()
+        h = h[order]
+
+        if initial_states is None:
+            state = rng.integers(0, 2, size=(num_vars, num_reads), dtype=np.int8)
+        else:
+            state = np.array(initial_states, dtype=np.int8)[:, order].T.copy()
+            num_reads = state.shape[1]
+
+        blocks = []
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            # J is symmetric, the fields of the neighbours n of the class change by J[n, class] @ change
+            neighbours = np.unique(J[lo:hi].indices)
+            blocks.append((lo, hi, neighbours, J[neighbours][:, lo:hi].tocsr()))
+        field = h[:, None] + J @ state
+        for beta in beta_schedule.tolist():
+            for lo, hi, neighbours, coupling in blocks:
+                flip = 1 - 2 * state[lo:hi]
+                delta = flip * field[lo:hi]
+                # exp(-beta * delta) >= 1 for delta <= 0, such flips are always accepted
+                accept = rng.random(delta.shape, dtype=np.float32) < np.exp(-beta * np.maximum(delta, 0))
+                change = flip * accept
+                state[lo:hi] += change
+                field[neighbours] += coupling @ change
+
+        state[order] = state.copy()
+        J = J[np.argsort(order)][:, np.argsort(order)]
+        h = h[np.argsort(order)]
+        samples = state.T
+        energies = samples @ h + 0.5 * np.einsum("ij,ij->i", samples, (J @ state).T)
+        info = {
+            "beta_range": (float(beta_schedule[0]), float(beta_schedule[-1])) if len(beta_schedule) else None,
+            "num_sweeps": len(beta_schedule),
+            "colour_classes": len(blocks),
+            "runtime": time.perf_counter() - start_time,
+        }
+        return dimod.SampleSet.from_samples((samples, labels), dimod.BINARY, energies, info=info)
+
+    def __coupling(self, Q):
+        """Variable labels, linear biases h and symmetric CSR coupling matrix J (zero diagonal) of Q."""
+        if isinstance(Q, dict):
+            labels = sorted({v for key in Q for v in key})
+            index = {v: i for i, v in enumerate(labels)}
+            keys = list(Q)
+            rows = np.array([index[i] for i, _ in keys], dtype=np.intp)
+            cols = np.array([index[j] for _, j in keys], dtype=np.intp)
+            values = np.array([Q[k] for k in keys], dtype=np.float64)
+            matrix = sp.csr_matrix((values, (rows, cols)), shape=(len(labels), len(labels)))
+        else:
+            matrix = sp.csr_matrix(Q, dtype=np.float64)
+            labels = list(range(matrix.shape[0]))
+        h = matrix.diagonal().copy()
+        # x_i x_j is the same term as x_j x_i, both halves go into the symmetric J
+        J = matrix + matrix.T
+        J.setdiag(0)
+        J.eliminate_zeros()
+        return labels, h, J.tocsr()
+
+
+def colour_classes(J):
+    """Greedy colouring of the graph of J, largest degree first. Returns the variables of every colour."""
+    J = sp.csr_matrix(J)
+    degree = np.diff(J.indptr)
+    colour = np.full(J.shape[0], -1, dtype=np.intp)
+    for v in np.argsort(-degree, kind="stable").tolist():
+        used = set(colour[J.indices[J.indptr[v]:J.indptr[v + 1]]].tolist())
+        c = 0
+        while c in used:
+            c += 1
+        colour[v] = c
+    return [np.flatnonzero(colour == c) for c in range(colour.max() + 1)] if len(colour) else []
+
+
+def default_beta_range(h, J, excitation_rate=0.01):
+    """
+    Inverse temperatures as chosen by neal, computed on the Ising form of the QUBO: at the hot
+    end every spin flips with probability at least 1/2, at the cold end the spins with the
+    smallest bias flip with probability excitation_rate in total.
+    """
+    coupling = abs(J).tocsr() / 4
+    field = np.abs(h / 2 + J.sum(axis=1).A1 / 4)
+    largest = field + coupling.sum(axis=1).A1
+    smallest = np.where(field > 0, field, np.inf)
+    for i in range(len(h)):
+        row = coupling.data[coupling.indptr[i]:coupling.indptr[i + 1]]
+        row = row[row > 0]
+        if len(row):
+            smallest[i] = min(smallest[i], row.min())
+    smallest = smallest[np.isfinite(smallest)]
+    if len(smallest) == 0:
+        return 0.1, 1.0
+    hot = math.log(2) / (2 * largest.max())
+    cold = math.log(np.count_nonzero(smallest == smallest.min()) / excitation_rate) / (2 * smallest.min())
+    return hot, cold
+
+
+def beta_schedule_of(beta_range, num_sweeps, beta_schedule_type="geometric"):
+    hot, cold = beta_range
+    if beta_schedule_type == "geometric":
+        return np.geomspace(hot, cold, num_sweeps)
+    if beta_schedule_type == "linear":
+        return np.linspace(hot, cold, num_sweeps)
+    raise ValueError(f"unknown beta_schedule_type {beta_schedule_type}")
@@ -1,6 +1,13 @@
 import time
+import numpy as np
 
 from docplex.mp.model import Model
+from docplex.mp.solution import SolveSolution
+
+from data.sp_metrics import tracer
+from data.sp_solution import SPSolution
+
+from .sp_greedy import greedy_cover
 
 class CPlexSP: 
     def __init__(self, gra) -> None:
@@ -13,23 +20,42 @@ class CPlexSP:
 
         TimeLimit = config.get("TimeLimit", 1)
         self.__model.set_time_limit(TimeLimit)
+        #warm_start: True for the greedy set cover or a mask of the activated lidars as MIP start,
+        #it replaces a start set before; without warm_start a start from add_mip_start is used
+        warm_start = config.get("warm_start", False)
+        if warm_start is not False and warm_start is not None:
+            self.add_mip_start(None if warm_start is True else warm_start)
 
-        start_time = time.time()
-        self.__model.solve()
-        runtime = time.time() - start_time  
+        with tracer.span("cplex.solve", time_limit=TimeLimit, warm_start=warm_start is not False and warm_start is not None):
+            start_time = time.time()
+            self.__model.solve()
+            runtime = time.time() - start_time  
 
-        solution = {var.name.replace("m", "-"): var.solution_value for var in self.__model.iter_variables()}
+        solution = SPSolution(self.gra, [self.__x[l].solution_value > 0.5 for l in self.gra.listLidar3D])
 
         return {"solution": solution, "runtime": runtime}
     
 
+    def add_mip_start(self, lidars=None):
+        """
+        Sets the activated lidars (mask over listLidar3D, by default the greedy set cover) as MIP start,
+        replacing earlier starts.
+        """
+        self.__model.clear_mip_starts()
+        if lidars is None:
+            lidars = greedy_cover(self.gra.coverage)
+        lidars = np.asarray(lidars, dtype=bool)
+        start = {self.__x[l]: int(v) for l, v in zip(self.gra.listLidar3D, lidars.tolist())}
+        self.__model.add_mip_start(SolveSolution(self.__model, start))
+
     def build_model(self):
-        x = self.__model.binary_var_dict(self.gra.listLidar3D, name='x')
-        self.__model.objective_expr = sum(x[i] for i in self.gra.listLidar3D)
-        self.__model.objective_sense = 'min'
-        for node in self.gra.listStreetPoints3D:
-            has_neighbour=0
-            for v in self.gra.G.neighbors(node): 
-                has_neighbour=1
-            if has_neighbour:
-                self.__model.add_constraint(1 <= sum(x[v] for v in self.gra.G.neighbors(node)))
\ No newline at end of file
+        with tracer.span("cplex.build"):
+            x = self.__x = self.__model.binary_var_dict(self.gra.listLidar3D, name='x')
+            self.__model.objective_expr = sum(x[i] for i in self.gra.listLidar3D)
+            self.__model.objective_sense = 'min'
+            for s in range(len(self.gra.listStreetPoints3D)):
+                lidar_ids = self.gra.lidars_of(s)
+                if len(lidar_ids):
+                    self.__model.add_constraint(1 <= sum(x[self.gra.listLidar3D[v]] for v in lidar_ids))
+            tracer.count("cplex.variables", self.__model.number_of_variables)
+            tracer.count("cplex.constraints", self.__model.number_of_constraints)
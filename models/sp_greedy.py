@@ -0,0 +1,102 @@
+import heapq
+import time
+import numpy as np
+
+from data.sp_solution import SPSolution
+
+
+def greedy_cover(incidence):
+    """
+    Greedy set cover of the street point x lidar incidence matrix followed by redundancy pruning.
+    Lidars are taken by decreasing number of newly covered street points (lazy priority queue),
+    afterwards every chosen lidar whose street points are all covered by other chosen lidars is
+    dropped again, smallest first. Street points without lidar are ignored.
+    Returns the mask of the chosen lidars.
+    """
+    csr = incidence.tocsr()
+    csc = csr.tocsc()
+    num_rows, num_lidars = csr.shape
+    covered = np.diff(csr.indptr) == 0
+    chosen = np.zeros(num_lidars, dtype=bool)
+
+    gain = np.diff(csc.indptr)
+    heap = [(-g, i) for i, g in enumerate(gain.tolist()) if g > 0]
+    heapq.heapify(heap)
+    while heap:
+        g, i = heapq.heappop(heap)
+        rows = csc.indices[csc.indptr[i]:csc.indptr[i + 1]]
+        new = np.count_nonzero(~covered[rows])
+        if new == 0:
+            continue
+        if new < -g:
+            # the gain is outdated, put the lidar back with its current gain
+            heapq.heappush(heap, (-new, i))
+            continue
+        chosen[i] = True
+        covered[rows] = True
+
+    #remove redundant lidars
+    count = csr @ chosen.astype(np.int32)
+    for i in np.flatnonzero(chosen)[np.argsort(gain[chosen], kind="stable")].tolist():
+        rows = csc.indices[csc.indptr[i]:csc.indptr[i + 1]]
+        if np.all(count[rows] >= 2):
+            chosen[i] = False
+            count[rows] -= 1
+    return chosen
+
+
+class GreedySP:
+    """Greedy set cover heuristic on the coverage of SPData, with the solve interface of the other models."""
+
+    def __init__(self, gra) -> None:
+        self.gra = gra
+
+    def solve(self, **config):
+        start_time = time.time()
+        chosen = greedy_cover(self.gra.coverage)
+        runtime = time.time() - start_time
+
+        return {"solution": SPSolution(self.gra, chosen), "runtime": runtime}
+
+
+def repair_covers(incidence, samples):
+    """
+    Adds lidars to every row of samples (samples x lidars array of 0/1) until all street points
+    with a lidar are covered, each step taking per sample the lidar covering the most uncovered
+    street points. All samples are repaired together.
+    """
+    csr = incidence.tocsr()
+    samples = np.array(samples, dtype=np.int8)
+    coverable = (np.diff(csr.indptr) > 0)[:, None]
+    index = np.arange(len(samples))
+    while True:
+        uncovered = ((csr @ samples.T.astype(np.int32)) == 0) & coverable
+        if not uncovered.any():
+            return samples
+        gain = csr.T @ uncovered.astype(np.int32)
+        best = np.argmax(gain, axis=0)
+        todo = gain[best, index] > 0
+        samples[index[todo], best[todo]] = 1
+
+
+def prune_covers(incidence, samples):
+    """
+    Removes redundant lidars from every row of samples: a lidar is redundant if each of its street
+    points is covered by another activated lidar. Per step and sample the redundant lidar with the
+    fewest street points is removed, all samples are pruned together.
+    """
+    csr = incidence.tocsr()
+    samples = np.array(samples, dtype=np.int8)
+    # lidars with fewer street points are removed first
+    size = np.diff(csr.tocsc().indptr)
+    priority = (size.max(initial=0) + 1 - size)[None, :]
+    index = np.arange(len(samples))
+    while True:
+        count = csr @ samples.T.astype(np.int32)
+        redundant = ((csr.T @ (count == 1).astype(np.int32)) == 0).T & (samples == 1)
+        if not redundant.any():
+            return samples
+        score = redundant * priority
+        worst = np.argmax(score, axis=1)
+        todo = score[index, worst] > 0
+        samples[index[todo], worst[todo]] = 0
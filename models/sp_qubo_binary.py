@@ -1,195 +1,570 @@
+import copy
+import logging
 import math
 import time
 import numpy as np
-import networkx as nx
+
+from concurrent.futures import ProcessPoolExecutor
+from scipy import sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+from data.sp_metrics import tracer
+from data.sp_solution import SPSolution
+
+from .sp_greedy import greedy_cover, prune_covers, repair_covers
+from .sp_reduction import ReductionPipeline, dominated_columns
+
+logger = logging.getLogger(__name__)
 
 class QuboSPBinary:
-    def __init__(self, gra, P1=1, P2=2, P3=2, process=False) -> None: # process is a boolean to choose between the old QuboSPBinary and the new version implemented 
-        start_time = time.time() 
-        self.gra = gra
-        self.radar1 = []
-        self.radar0 = []     
-        self.usedLidars = []
-        self.mandatoryLidars = []
-        self.P1 = P1
-        self.P2 = P2
-        self.P3 = P3
+    def __init__(self, gra, P1=1, P2=2, P3=2, process=False, sparse=False, dtype=np.float64) -> None: # process is a boolean to choose between the old QuboSPBinary and the new version implemented 
+        """
+        sparse: keep the QUBO matrix as scipy CSR matrix in self.model instead of a dense array.
+        dtype: dtype of the coefficients, e.g. np.float32 or an integer type for integer penalties.
+
+        The graph of gra is not changed, the street points and lidars left after preprocessing
+        are kept in self.street_point_ids and self.active_lidar_ids. The matrix is stored as
+        penalty free parts (self.parts), so with_penalties() gives the model for other
+        penalties without building it again.
+        """
+        with tracer.span("qubo.init", process=process, sparse=sparse):
+            start_time = time.time() 
+            self.gra = gra
+            self.radar1 = []
+            self.radar0 = []     
+            self.usedLidars = []
+            self.mandatoryLidars = []
+            self.P1 = P1
+            self.P2 = P2
+            self.P3 = P3
+            self.sparse = sparse
+            self.dtype = np.dtype(dtype)
+            self.street_point_ids, self.active_lidar_ids = gra.graph_ids()
         
-        self.identify_isolated_nodes()
-        #parameter to choose between the old QuboSPBinary and the new version implemented
-        if process:
-            self.solve_preprocessing(P1, P2, P3) #Processing part in order to reduce the dimensionality of the Qubo Matrix
-        self.identify_isolated_nodes()
-        self.model = self.__compute_QUBO_Matrix_binary(P1, P2, P3)
-        init_time = time.time() - start_time  
+            self.identify_isolated_nodes()
+            #parameter to choose between the old QuboSPBinary and the new version implemented
+            if process:
+                self.solve_preprocessing(P1, P2, P3) #Processing part in order to reduce the dimensionality of the Qubo Matrix
+            self.identify_isolated_nodes()
+            self.model = self.__compute_QUBO_Matrix_binary(P1, P2, P3)
+            if not sparse:
+                self.model = self.model.toarray()
+            self.init_time = time.time() - start_time  
+            tracer.count("qubo.isolated_nodes", self.isolated_nodes)
 
     # Function to identify isolated nodes in the graph
     def identify_isolated_nodes(self):
         """
-        This function identifies isolated nodes in the graph and removes them.
+        This function counts the isolated nodes (lidars and street points without connection) in the graph.
+        The count is kept in self.isolated_nodes and reported as tracer counter qubo.isolated_nodes.
         """
-        isolated_nodes = list(nx.isolates(self.gra.G))
-        print(f"Isolated nodes: {len(isolated_nodes)}")
+        incidence, _, _ = self.__active_incidence()
+        isolated_nodes = np.count_nonzero(incidence.getnnz(axis=0) == 0) + np.count_nonzero(incidence.getnnz(axis=1) == 0)
+        self.isolated_nodes = isolated_nodes
+        logger.debug("Isolated nodes: %d", isolated_nodes)
+
+    def __active_incidence(self):
+        """Coverage matrix restricted to the street points and lidars left in the graph, with their ids."""
+        incidence = self.gra.coverage[self.street_point_ids][:, self.active_lidar_ids]
+        return incidence, self.street_point_ids, self.active_lidar_ids
         
     def __inverter_matrix(self, sample):
-        solution_dict = {
-            f"x_{self.usedLidars[i][0]}_{self.usedLidars[i][1]}_{self.usedLidars[i][2]}_{self.usedLidars[i][3]}_{self.usedLidars[i][4]}": sample[
-                i
-            ]
-            for i in range(len(self.usedLidars))
-        }
-        return solution_dict
+        """SPSolution with the lidar values of the sample (variables 0 .. len(usedLidars) - 1)."""
+        solution = SPSolution(self.gra)
+        solution.activated[self.lidar_ids] = [sample[i] == 1 for i in range(len(self.usedLidars))]
+        return solution
 
-    def solve(self, solve_func, **config):
-        start_time = time.time()  
-        answer = solve_func(Q=self.model, **config)
-        solve_time = time.time() - start_time  
+    def merge_decisions(self, solution):
+        """Sets the lidars decided by the preprocessing (radar0, radar1) in the solution."""
+        for value, lidars in ((False, self.radar0), (True, self.radar1)):
+            solution.activated[[self.gra.lidar_index[l] for l in lidars]] = value
+        return solution
 
-        solution = self.__inverter_matrix(answer.first.sample)
-        info = answer.info
+    def solve(self, solve_func, repair=False, **config):
+        """
+        repair: post-process all samples with best_solution instead of taking the first sample,
+        the solution then covers every coverable street point and includes radar0/radar1.
+        """
+        with tracer.span("qubo.solve", repair=repair):
+            start_time = time.time()  
+            answer = self.__sample(solve_func, **config)
+            if repair:
+                solution, energy, info = self.best_solution(answer)
+            else:
+                solution = self.__inverter_matrix(answer.first.sample)
+                energy = answer.first.energy
+                info = answer.info
+            solve_time = time.time() - start_time  
+            tracer.count("qubo.reads", len(answer))
 
         return {
             "solution": solution,
-            "energy": answer.first.energy,
+            "energy": energy,
             "runtime": solve_time,
             "info": info,
         }
 
-    def __needed_bitnum(self, decnum):
-        if decnum == 0:
-            return 0
-        return int(math.ceil(math.log2(decnum)))
+    def best_solution(self, answer):
+        """
+        Repairs all samples of the SampleSet (uncovered street points get lidars greedily) and removes
+        redundant lidars, then picks the solution with the fewest lidars, ties broken by the energy of
+        the sample. Returns the solution with the preprocessing decisions radar0/radar1 merged in,
+        the energy of the chosen sample and info on the post-processing.
+        """
+        samples = self.lidar_samples(answer)
+        feasible = coverage_violations(self.incidence, samples) == 0
+        repaired = prune_covers(self.incidence, repair_covers(self.incidence, samples))
+        objective = repaired.sum(axis=1)
+        best = np.lexsort((answer.record.energy, objective))[0]
+
+        solution = self.merge_decisions(self.__inverter_matrix(repaired[best]))
+        info = dict(
+            answer.info,
+            objective=int(objective[best]) + len(self.radar1),
+            feasible_samples=int(np.count_nonzero(feasible)),
+            changed_samples=int(np.count_nonzero((repaired != samples).any(axis=1))),
+        )
+        return solution, answer.record.energy[best], info
+
+    def __sample(self, solve_func, **config):
+        if self.sparse:
+            return solve_func(Q=self.to_qubo_dict(), **config)
+        return solve_func(Q=self.model, **config)
+
+    def warm_start(self, num_reads=1, lidars=None):
+        """
+        (num_reads x variables) initial states for samplers (initial_states) built from the lidar
+        values lidars over usedLidars, by default the greedy set cover; the slack bits are set
+        consistently with the cover counts.
+        """
+        if lidars is None:
+            lidars = greedy_cover(self.incidence)
+        return np.tile(qubo_state(self.incidence, lidars), (num_reads, 1))
+
+    def energies(self, states):
+        """QUBO energies of the rows of states (samples x variables), x^T Q x for every row."""
+        states = np.atleast_2d(np.asarray(states, dtype=np.float64))
+        return np.einsum("ij,ij->i", np.asarray(states @ self.model), states)
+
+    def qubo_samples(self, answer):
+        """All variables of all samples of a SampleSet as (samples x variables) int8 array."""
+        columns = [answer.variables.index(i) for i in range(self.model.shape[0])]
+        return np.asarray(answer.record.sample[:, columns], dtype=np.int8)
+
+    def lidar_samples(self, answer):
+        """Values of the lidar variables of all samples of a SampleSet as (samples x usedLidars) int8 array."""
+        columns = [answer.variables.index(i) for i in range(len(self.usedLidars))]
+        return np.asarray(answer.record.sample[:, columns], dtype=np.int8)
+
+    def calibrate(self, solve_func, target=0.5, start=0.125, steps=4, max_doublings=10, **config):
+        """
+        Searches the smallest penalties P2, P3 (scaled together, P1 fixed) for which at least the
+        fraction target of the samples of solve_func covers every coverable street point.
+        Every trial is one short solve_func call, config should therefore ask for few reads and
+        sweeps (default num_reads=100, num_sweeps=100). The scale starts at start times the
+        current penalties, is doubled until the target is reached and then refined by bisection
+        in steps steps. For integer dtypes the penalties are rounded up. If the target is never
+        reached, the penalties of the trial with the highest feasibility are chosen.
+
+        Returns the model with the calibrated penalties, its calibration attribute holds the
+        chosen penalties, all trials and the total cost of the calibration.
+        """
+        start_time = time.time()
+        config = dict({"num_reads": 100, "num_sweeps": 100}, **config)
+        integer = self.dtype.kind in "iu"
+        trials = {}
+
+        def penalties(scale):
+            P2, P3 = scale * self.P2, scale * self.P3
+            if integer:
+                P2, P3 = math.ceil(P2), math.ceil(P3)
+            return P2, P3
+
+        def feasible(scale):
+            P2, P3 = penalties(scale)
+            if (P2, P3) not in trials:
+                trial_time = time.time()
+                with tracer.span("qubo.calibration_trial", P2=P2, P3=P3):
+                    answer = self.with_penalties(self.P1, P2, P3).__sample(solve_func, **config)
+                    violations = coverage_violations(self.incidence, self.lidar_samples(answer))
+                tracer.count("qubo.calibration_trials")
+                trials[(P2, P3)] = {
+                    "P2": P2,
+                    "P3": P3,
+                    "feasibility": float(np.mean(violations == 0)),
+                    "reads": len(violations),
+                    "runtime": time.time() - trial_time,
+                }
+            return trials[(P2, P3)]["feasibility"] >= target
+
+        low, high = None, start
+        for _ in range(max_doublings):
+            if feasible(high):
+                break
+            low, high = high, 2 * high
+        else:
+            high = None
+        if high is not None and low is None:
+            #the start is feasible, search downwards
+            low = high / 2
+            while low > start / 2**max_doublings and feasible(low):
+                high, low = low, low / 2
+        if high is not None:
+            for _ in range(steps):
+                middle = (low + high) / 2
+                if feasible(middle):
+                    high = middle
+                else:
+                    low = middle
+            P2, P3 = penalties(high)
+        else:
+            best = max(trials.values(), key=lambda t: t["feasibility"])
+            P2, P3 = best["P2"], best["P3"]
+            tracer.count("qubo.calibration_target_missed")
+            logger.warning("Calibration: target feasibility %s not reached, best %s", target, best["feasibility"])
+
+        model = self.with_penalties(self.P1, P2, P3)
+        model.calibration = {
+            "P1": self.P1,
+            "P2": P2,
+            "P3": P3,
+            "feasibility": trials[(P2, P3)]["feasibility"],
+            "target_reached": trials[(P2, P3)]["feasibility"] >= target,
+            "trials": list(trials.values()),
+            "reads": sum(t["reads"] for t in trials.values()),
+            "runtime": time.time() - start_time,
+        }
+        return model
+
+    def with_penalties(self, P1, P2, P3):
+        """
+        Copy of the model with the penalties P1, P2, P3. Only the coefficients are
+        recombined from self.parts, preprocessing and slack layout are shared.
+        """
+        model = copy.copy(self)
+        model.P1, model.P2, model.P3 = P1, P2, P3
+        model.model = model.__as_dtype(combine_parts(self.parts, P1, P2, P3))
+        if not self.sparse:
+            model.model = model.model.toarray()
+        return model
+
+    def to_dense(self):
+        """QUBO matrix as dense numpy array."""
+        if self.sparse:
+            return self.model.toarray()
+        return self.model
+
+    def to_qubo_dict(self):
+        """QUBO as {(i, j): coefficient} with i <= j, every variable has a diagonal entry."""
+        return qubo_dict(self.model)
+
+    def to_bqm(self):
+        """QUBO as dimod.BinaryQuadraticModel, built straight from the index and coefficient vectors."""
+        import dimod
+
+        diag, rows, cols, values = upper_triangle(self.model)
+        return dimod.BinaryQuadraticModel.from_numpy_vectors(diag, (rows, cols, values), 0.0, dimod.BINARY)
+
+    def components(self):
+        """
+        Connected components of the coverage graph of the QUBO variables as list of
+        (lidar positions in usedLidars, street point rows of self.incidence).
+        Street points without lidar are left out.
+        """
+        num_rows, num_lidars = self.incidence.shape
+        graph = sp.bmat([[None, self.incidence], [self.incidence.T, None]])
+        _, labels = connected_components(graph, directed=False)
+        row_labels, lidar_labels = labels[:num_rows], labels[num_rows:]
+
+        res = []
+        lidar_order = np.argsort(lidar_labels, kind="stable")
+        row_order = np.argsort(row_labels, kind="stable")
+        lidar_splits = np.flatnonzero(np.diff(lidar_labels[lidar_order])) + 1
+        for lidar_pos in np.split(lidar_order, lidar_splits):
+            if len(lidar_pos) == 0:
+                continue
+            label = lidar_labels[lidar_pos[0]]
+            lo, hi = np.searchsorted(row_labels[row_order], [label, label + 1])
+            res.append((lidar_pos, np.sort(row_order[lo:hi])))
+        return res
+
+    def solve_decomposed(self, solve_func, workers=None, **config):
+        """
+        Solves every connected component of the problem as its own QUBO with solve_func,
+        in a process pool if workers > 1 (solve_func must then be picklable), and merges the
+        results. The energy is the sum of the component energies, which equals the energy
+        of the merged sample in the full QUBO.
+        """
+        with tracer.span("qubo.solve_decomposed", workers=workers):
+            start_time = time.time()
+            parts = self.components()
+            tasks = []
+            sizes = []
+            for lidar_pos, rows in parts:
+                Q, _ = qubo_matrix(self.incidence[rows][:, lidar_pos], self.P1, self.P2, self.P3)
+                Q = self.__as_dtype(Q)
+                sizes.append(Q.shape[0])
+                tasks.append((solve_func, qubo_dict(Q) if self.sparse else Q.toarray(), len(lidar_pos), config))
+
+            if workers is not None and workers > 1 and len(tasks) > 1:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(_solve_part, tasks))
+            else:
+                results = [_solve_part(task) for task in tasks]
 
-    def __is_in_list(self, mylist, target):
-        for i in mylist:
-            if target == i:
-                return True
-        return False
+            sample = np.zeros(len(self.usedLidars), dtype=np.int8)
+            for (lidar_pos, _), (values, _, _) in zip(parts, results):
+                sample[lidar_pos] = values
+            solve_time = time.time() - start_time
+            tracer.count("qubo.components", len(parts))
+
+        return {
+            "solution": self.__inverter_matrix(sample),
+            "energy": sum(r[1] for r in results),
+            "runtime": solve_time,
+            "info": {
+                "components": len(parts),
+                "component_sizes": sizes,
+                "component_runtimes": [r[2] for r in results],
+            },
+        }
+
+    def __needed_bitnum(self, decnum):
+        return needed_bitnum(decnum)
 
     def reduce_q(self, lidar):
-        self.gra.G.remove_node(lidar)
-        for edge in list(self.gra.G.edges):
-            if lidar in edge:
-                self.gra.G.remove_edge(edge[0], edge[1])
+        self.__drop_lidars([self.gra.lidar_index[lidar]])
+
+    def __drop_lidars(self, lidar_ids):
+        """Removes the lidar ids from active_lidar_ids with one mask, whatever their number."""
+        keep = np.ones(len(self.gra.lidars), dtype=bool)
+        keep[lidar_ids] = False
+        self.active_lidar_ids = self.active_lidar_ids[keep[self.active_lidar_ids]]
 
     def remove_slack_zero(self):
         """
-        This function removes lidars if a street point is connected to this unique lidar."""
-
-        to_delete = []
-        for node in self.gra.G.nodes:
-            if node not in to_delete:
-                # If the node is a "street point"
-                if len(node) == 3:
-                    # Check if the node has neighbors
-                    if len(self.gra.G.adj[node]) == 0:
-                        #raise ValueError(f"Isolated node detected: {node}. This node has no neighbors.")
-                        print(f"Isolated node detected: {node}. This node has no neighbors.")
-                    else: 
-                        # Calculate the number of bits needed for slack using log2
-                        slackbits = self.__needed_bitnum(len(self.gra.G.adj[node].items()))
-                        if slackbits == 0: #If slackbits == 0 the we know that v_i is connected to a unique lidar (which can then be trivially put to 1)
-                            # Get the first lidar
-                            
-                            lidar_node = next(iter(self.gra.G.adj[node].items()))[0]
-                            # Add all street points connected to the lidar to the deletion list
-                            all_street_points = self.gra.G.adj[lidar_node]
-                            for street_point in all_street_points:
-                                to_delete.append(street_point)
-                            
-                            # Add the lidar to the deletion list and radar1
-                            to_delete.append(lidar_node)
-                            self.radar1.append(lidar_node)
-        
-        # Remove nodes marked for deletion
-        for node_to_delete in list(set(to_delete)):
-            self.gra.G.remove_node(node_to_delete)
+        This function removes lidars if a street point is connected to this unique lidar.
+        The lidar is set to 1 (radar1) and its street points are dropped from street_point_ids,
+        gra.G is not changed.
+        """
+        incidence, street_point_ids, lidar_ids = self.__active_incidence()
+        isolated = np.count_nonzero(incidence.getnnz(axis=1) == 0)
+        if isolated:
+            tracer.count("qubo.isolated_street_points", isolated)
+            logger.debug("%d isolated street points detected. These nodes have no neighbors.", isolated)
+
+        # one application of the forced lidar rule of the ReductionPipeline
+        reduction = ReductionPipeline(incidence, rules=("forced_lidars",))
+        reduction.forced_lidars()
+        for i in reduction.radar1:
+            self.radar1.append(self.gra.listLidar3D[lidar_ids[i]])
+        self.street_point_ids = street_point_ids[reduction.active_street_points]
+        self.active_lidar_ids = lidar_ids[reduction.active_lidars]
 
     def find_similar_lidar(self): 
         """
-        Find lidars acting on the same street points and reduce the dimensionality of the Qubo Matrix
-        """
-        liders = []
-        for lidar1 in self.gra.G.nodes:
-            if len(lidar1) != 3: #Checking that the node is indeed a lidar
-                liders.append(lidar1)
-        for lidar1 in liders:
-            for lidar2 in liders:
-                if lidar1 != lidar2:
-                    if lidar1 in self.gra.G.nodes and lidar2 in self.gra.G.nodes:
-                        adj1 = self.gra.G.adj[lidar1]
-                        adj2 = self.gra.G.adj[lidar2]
-                        #look if subset exists
-                        if adj1.items() <= adj2.items():
-                            self.reduce_q(lidar1)
-                            self.radar0.append(lidar1)
-                        elif adj2.items() < adj1.items():
-                            self.reduce_q(lidar2)
-                            self.radar0.append(lidar2)
-
-    def solve_preprocessing(self, P1, P2, P3): #Putting the 2 processing part together
-        start_time = time.time()  
-        self.find_similar_lidar()
-        self.remove_slack_zero()
-        preprocessing_time = time.time() - start_time  # Calculate preprocessing time
+        Find lidars acting on the same street points and reduce the dimensionality of the Qubo Matrix.
+        A lidar whose street points are a subset of those of another lidar is set to 0 (radar0);
+        of lidars with equal street points the last one is kept.
+        The lidars are appended to radar0 in lidar id order. The former pairwise scan appended the
+        same lidars in the order it found them, so indices into radar0 differ from that version.
+        """
+        incidence, _, lidar_ids = self.__active_incidence()
+        dominated = lidar_ids[dominated_columns(incidence)]
+        for i in dominated.tolist():
+            self.radar0.append(self.gra.listLidar3D[i])
+        self.__drop_lidars(dominated)
+
+    def solve_preprocessing(self, P1, P2, P3): #Reduction rules applied until nothing changes
+        """
+        Runs the ReductionPipeline (find_similar_lidar, remove_slack_zero, street point dominance and
+        removal of lidars without coverage) to a fixpoint and drops the decided lidars and street points.
+        radar0 and radar1 are ordered by pass and rule, within a rule by lidar id.
+        The per-rule counts and timings are in self.preprocessing_report.
+        """
+        with tracer.span("qubo.preprocessing"):
+            start_time = time.time()  
+            incidence, street_point_ids, lidar_ids = self.__active_incidence()
+            self.reduction = ReductionPipeline(incidence).run()
+
+            for i in self.reduction.radar0:
+                self.radar0.append(self.gra.listLidar3D[lidar_ids[i]])
+            for i in self.reduction.radar1:
+                self.radar1.append(self.gra.listLidar3D[lidar_ids[i]])
+            self.street_point_ids = street_point_ids[self.reduction.active_street_points]
+            self.active_lidar_ids = lidar_ids[self.reduction.active_lidars]
+
+            preprocessing_time = time.time() - start_time  # Calculate preprocessing time
+            self.preprocessing_report = dict(self.reduction.report(), time=preprocessing_time)
+            tracer.count("qubo.reduced_lidars", len(self.reduction.radar0) + len(self.reduction.radar1))
+            tracer.count("qubo.reduced_street_points", len(street_point_ids) - len(self.street_point_ids))
+
     def __compute_QUBO_Matrix_binary(self, P1, P2, P3):
-        start_time = time.time()  # Timer for QUBO matrix computation
-        slacksize = 0
-        slacklist = []
-        #iterate over all nodes in G
-        for s in self.gra.G.nodes:
-            #if street point
-            if len(s) == 3:
-                #calc number of bits needed for slack with log2
-                slackbits = self.__needed_bitnum(len(self.gra.G.adj[s].items()))
-
-                lidar_per_SP = []
-                #iterate over all lidars that are connected to the street point
-                for ls in self.gra.G.adj[s].items():
-                    
-                    self.usedLidars.append(ls[0])
-                    lidar_per_SP.append(ls[0])
-                    #only one connection to lidar, therefore lidar must be activated
-                    if slackbits == 0:
-                        self.mandatoryLidars.append(ls[0])
-
-                slacklist.append(
-                    [lidar_per_SP, {slacksize + i + 1: 2**i for i in range(slackbits)}]
-                )
-                slacksize += slackbits
-
-        self.usedLidars = list(set(self.usedLidars))
-        ilist = list(range(len(self.usedLidars)))
-        usedLidars_index = dict(zip(self.usedLidars, ilist))
-        for s in slacklist:
-            if s[1]:
-                s[1] = {
-                    key + len(self.usedLidars) - 1: -value
-                    for key, value in s[1].items()
-                }
+        with tracer.span("qubo.assembly"):
+            start_time = time.time()  # Timer for QUBO matrix computation
+            incidence, _, lidar_ids = self.__active_incidence()
 
-        myQUBOsize = len(self.usedLidars) + slacksize
-        myQUBOMatrix = np.zeros([myQUBOsize, myQUBOsize], dtype=float)
-
-        for i in range(0, len(self.usedLidars)):
-            myQUBOMatrix[i, i] = P1
-            if self.__is_in_list(self.mandatoryLidars, self.usedLidars[i]):
-                myQUBOMatrix[i, i] -= P2
-
-        for s in slacklist:
-            if s[1]:
-                sdict = s[1]
-                ldict = {}
-                for l in s[0]:
-                    ldict[usedLidars_index[l]] = 1
-                ldict.update(sdict)
-
-                for i in ldict:
-                    myQUBOMatrix[i, i] -= 2 * P3 * ldict[i]
-                    for j in ldict:
-                        myQUBOMatrix[i, j] += P3 * ldict[i] * ldict[j]
-
-        qubo_time = time.time() - start_time  # Calculate QUBO matrix computation time
-        print(f"QUBO matrix computation time: {qubo_time:.4f} seconds")
+            #only lidars connected to a street point are variables
+            used = incidence.getnnz(axis=0) > 0
+            self.incidence = incidence[:, used].tocsr()
+            self.lidar_ids = lidar_ids[used]
+            self.usedLidars = [self.gra.listLidar3D[i] for i in self.lidar_ids]
+
+            self.parts, mandatory = qubo_parts(self.incidence)
+            self.mandatoryLidars = [self.usedLidars[i] for i in np.flatnonzero(mandatory)]
+            myQUBOMatrix = self.__as_dtype(combine_parts(self.parts, P1, P2, P3))
+
+            self.qubo_time = time.time() - start_time  # Calculate QUBO matrix computation time
+            tracer.count("qubo.variables", myQUBOMatrix.shape[0])
+            tracer.count("qubo.slack_bits", myQUBOMatrix.shape[0] - len(self.usedLidars))
+            tracer.count("qubo.nnz", myQUBOMatrix.nnz)
+            logger.debug("QUBO matrix computation time: %.4f seconds", self.qubo_time)
         
-        return myQUBOMatrix
+            return myQUBOMatrix
+
+    def __as_dtype(self, matrix):
+        if self.dtype.kind in "iu" and not np.all(matrix.data == np.round(matrix.data)):
+            raise ValueError(f"penalties P1={self.P1}, P2={self.P2}, P3={self.P3} do not give integer coefficients for dtype {self.dtype}")
+        return matrix.astype(self.dtype)
+
+
+def needed_bitnum(decnum):
+    if decnum == 0:
+        return 0
+    return int(math.ceil(math.log2(decnum)))
+
+
+def qubo_matrix(incidence, P1, P2, P3):
+    """
+    QUBO matrix (scipy CSR, symmetric) of the street point x lidar incidence matrix. The variables are
+    the lidars (columns) followed by the slack bits of the street points with more than one lidar.
+    Also returns the mask of the mandatory lidars (single lidar of a street point).
+    """
+    parts, mandatory = qubo_parts(incidence)
+    return combine_parts(parts, P1, P2, P3), mandatory
+
+
+def combine_parts(parts, P1, P2, P3):
+    """P1 * A + P2 * B + P3 * C of the parts of qubo_parts, computed on the shared sparsity pattern."""
+    A, B, C = parts
+    return sp.csr_matrix((P1 * A.data + P2 * B.data + P3 * C.data, A.indices, A.indptr), shape=A.shape)
+
+
+def slack_layout(incidence):
+    """Number of slack bits and index of the first slack bit of every street point (row)."""
+    degree = np.diff(incidence.tocsr().indptr)
+    #number of bits needed for slack with log2 (0 for a single connection)
+    slackbits = np.array([needed_bitnum(k) for k in degree.tolist()], dtype=np.intp)
+    slack_start = incidence.shape[1] + np.cumsum(slackbits) - slackbits
+    return slackbits, slack_start
+
+
+def qubo_state(incidence, lidars):
+    """
+    Values of all QUBO variables for the lidar values lidars (one solution or samples x lidars):
+    the slack of a street point covered by k lidars is set to k - 1 in binary, so its constraint
+    is fulfilled (0 if not covered).
+    """
+    lidars = np.asarray(lidars, dtype=np.int8)
+    samples = np.atleast_2d(lidars)
+    slackbits, slack_start = slack_layout(incidence)
+    slack = np.maximum((incidence.tocsr() @ samples.T.astype(np.int64)).T - 1, 0)
+    state = np.zeros((len(samples), incidence.shape[1] + int(slackbits.sum())), dtype=np.int8)
+    state[:, :samples.shape[1]] = samples
+    rows = np.repeat(np.arange(len(slackbits)), slackbits)
+    bit = np.arange(len(rows)) - np.repeat(slack_start - incidence.shape[1], slackbits)
+    state[:, np.repeat(slack_start, slackbits) + bit] = (slack[:, rows] >> bit) & 1
+    return state if lidars.ndim > 1 else state[0]
+
+
+def qubo_parts(incidence):
+    """
+    Penalty free parts (A, B, C) of the QUBO matrix, Q = P1 * A + P2 * B + P3 * C:
+    A counts the activated lidars, B rewards the mandatory lidars and C is the sum of the
+    squared constraints. The parts are CSR matrices with the same sparsity pattern.
+    Also returns the mask of the mandatory lidars.
+    """
+    incidence = incidence.tocsr()
+    num_lidars = incidence.shape[1]
+    degree = np.diff(incidence.indptr)
+    slackbits, slack_start = slack_layout(incidence)
+    slacksize = int(slackbits.sum())
+
+    #only one connection to lidar, therefore lidar must be activated
+    mandatory = np.zeros(num_lidars, dtype=bool)
+    mandatory[incidence.indices[incidence.indptr[:-1][degree == 1]]] = True
+
+    #variables and coefficients of the constraints sum(lidars) - sum(2^i slack_i) = 1, grouped by street point
+    constrained = slackbits > 0
+    lidar_group = np.repeat(np.arange(len(degree)), degree)
+    lidar_part = constrained[lidar_group]
+    slack_group = np.repeat(np.flatnonzero(constrained), slackbits[constrained])
+    slack_bit = np.arange(len(slack_group)) - np.repeat(np.cumsum(slackbits[constrained]) - slackbits[constrained], slackbits[constrained])
+
+    group = np.concatenate((lidar_group[lidar_part], slack_group))
+    var = np.concatenate((incidence.indices[lidar_part], slack_start[slack_group] + slack_bit))
+    coef = np.concatenate((np.ones(np.count_nonzero(lidar_part)), -(2.0 ** slack_bit)))
+    order = np.argsort(group, kind="stable")
+    group, var, coef = group[order], var[order], coef[order]
+
+    #all pairs (i, j) of variables of the same constraint
+    size = np.bincount(group, minlength=len(degree))
+    first = np.concatenate(([0], np.cumsum(size)[:-1]))
+    pair_count = size[group]
+    left = np.repeat(np.arange(len(var)), pair_count)
+    right = first[group[left]] + (np.arange(len(left)) - np.repeat(np.cumsum(pair_count) - pair_count, pair_count))
+
+    myQUBOsize = num_lidars + slacksize
+    objective = np.zeros(myQUBOsize)
+    objective[:num_lidars] = 1
+    reward = np.zeros(myQUBOsize)
+    reward[:num_lidars][mandatory] = -1
+    constraint = np.bincount(var, weights=-2 * coef, minlength=myQUBOsize)
+
+    rows = np.concatenate((np.arange(myQUBOsize), var[left]))
+    cols = np.concatenate((np.arange(myQUBOsize), var[right]))
+    no_pairs = np.zeros(len(left))
+    parts = tuple(
+        sp.csr_matrix((values, (rows, cols)), shape=(myQUBOsize, myQUBOsize))
+        for values in (
+            np.concatenate((objective, no_pairs)),
+            np.concatenate((reward, no_pairs)),
+            np.concatenate((constraint, coef[left] * coef[right])),
+        )
+    )
+    return parts, mandatory
+
+
+def upper_triangle(matrix):
+    """Diagonal and merged upper off-diagonal entries (rows, cols, values) of a symmetric QUBO matrix."""
+    matrix = sp.csr_matrix(matrix)
+    upper = sp.triu(matrix, k=1, format="coo")
+    return matrix.diagonal(), upper.row, upper.col, 2 * upper.data
+
+
+def qubo_dict(matrix):
+    """QUBO as {(i, j): coefficient} with i <= j, every variable has a diagonal entry."""
+    diag, rows, cols, values = upper_triangle(matrix)
+    qubo = {(i, i): v for i, v in enumerate(diag.tolist())}
+    qubo.update(zip(zip(rows.tolist(), cols.tolist()), values.tolist()))
+    return qubo
+
+
+def coverage_violations(incidence, samples):
+    """
+    Number of street points (rows of incidence with at least one lidar) not covered by the
+    activated lidars, for every row of samples (samples x lidars array of 0/1).
+    """
+    coverable = incidence.getnnz(axis=1) > 0
+    covered = incidence[coverable] @ np.asarray(samples, dtype=np.int32).T
+    return np.count_nonzero(covered == 0, axis=0)
+
+
+def _solve_part(task):
+    """Solves one component QUBO, returns the values of its lidar variables, energy and runtime."""
+    solve_func, Q, num_lidars, config = task
+    start_time = time.time()
+    answer = solve_func(Q=Q, **config)
+    runtime = time.time() - start_time
+    sample = answer.first.sample
+    return [sample[i] for i in range(num_lidars)], answer.first.energy, runtime
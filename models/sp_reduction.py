@@ -0,0 +1,185 @@
+import time
+import numpy as np
+
+
+class Bitsets:
+    """
+    Sets of row indices of the columns of a CSR/CSC matrix as python int bitsets.
+
+    Every set is stored relative to its smallest element, so a bitset only spans the
+    rows between its smallest and largest element.
+    """
+
+    def __init__(self, matrix):
+        csc = matrix.tocsc()
+        csc.sort_indices()
+        self.size = np.diff(csc.indptr)
+        self.low = np.zeros(len(self.size), dtype=np.int64)
+        self.high = np.full(len(self.size), -1, dtype=np.int64)
+        self.bits = []
+        for i in range(len(self.size)):
+            rows = csc.indices[csc.indptr[i]:csc.indptr[i + 1]]
+            if len(rows) == 0:
+                self.bits.append(0)
+                continue
+            self.low[i] = rows[0]
+            self.high[i] = rows[-1]
+            members = np.zeros(rows[-1] - rows[0] + 1, dtype=bool)
+            members[rows - rows[0]] = True
+            self.bits.append(int.from_bytes(np.packbits(members, bitorder="little").tobytes(), "little"))
+        self.low = self.low.tolist()
+        self.high = self.high.tolist()
+
+    def is_subset(self, i, j):
+        """True if set i is a subset of set j."""
+        if self.size[i] == 0:
+            return True
+        if self.low[i] < self.low[j] or self.high[i] > self.high[j]:
+            return False
+        shifted = self.bits[i] << (self.low[i] - self.low[j])
+        return shifted & self.bits[j] == shifted
+
+
+def dominated_columns(matrix):
+    """
+    Mask of the columns whose set of rows is a subset of the rows of another column.
+    Of several columns with equal rows the one with the highest index is kept.
+
+    Columns are processed by decreasing size, so a column only has to be compared with
+    the already kept columns sharing its row with the fewest kept columns.
+    """
+    csc = matrix.tocsc()
+    num_rows, num_cols = csc.shape
+    sets = Bitsets(csc)
+    order = np.lexsort((-np.arange(num_cols), -sets.size))
+
+    dominated = np.zeros(num_cols, dtype=bool)
+    kept_at = [[] for _ in range(num_rows)]
+    any_kept = False
+    for i in order.tolist():
+        rows = csc.indices[csc.indptr[i]:csc.indptr[i + 1]].tolist()
+        if not rows:
+            # an empty set is a subset of every other set
+            dominated[i] = any_kept
+            any_kept = True
+            continue
+        row = min(rows, key=lambda r: len(kept_at[r]))
+        if any(sets.is_subset(i, j) for j in kept_at[row]):
+            dominated[i] = True
+            continue
+        any_kept = True
+        for r in rows:
+            kept_at[r].append(i)
+    return dominated
+
+
+def dominated_rows(matrix):
+    """
+    Mask of the non-empty rows whose set of columns is a superset of the columns of another
+    row. Of several rows with equal columns the one with the lowest index is kept.
+    """
+    csr = matrix.tocsr()
+    csc = csr.tocsc()
+    num_rows = csr.shape[0]
+    sets = Bitsets(csr.T)
+    order = np.lexsort((np.arange(num_rows), sets.size))
+    column_size = np.diff(csc.indptr)
+
+    dominated = np.zeros(num_rows, dtype=bool)
+    for a in order.tolist():
+        if dominated[a] or sets.size[a] == 0:
+            continue
+        # a is kept, every row containing all columns of a is redundant
+        cols = csr.indices[csr.indptr[a]:csr.indptr[a + 1]]
+        col = cols[np.argmin(column_size[cols])]
+        for b in csc.indices[csc.indptr[col]:csc.indptr[col + 1]].tolist():
+            if b != a and not dominated[b] and sets.is_subset(a, b):
+                dominated[b] = True
+    return dominated
+
+
+class ReductionPipeline:
+    """
+    Applies reduction rules to a street point x lidar incidence matrix until none of them
+    changes anything. All rules keep an optimal solution of the covering problem:
+
+    empty_lidars: lidars without an active street point are set to 0.
+    dominated_lidars: lidars covering a subset of the street points of another lidar are set to 0
+        (find_similar_lidar).
+    forced_lidars: a street point with a single lidar forces this lidar to 1, all street points
+        of the lidar are covered (remove_slack_zero).
+    dominated_street_points: a street point whose lidars are a superset of the lidars of another
+        street point is covered whenever the other one is, its constraint is dropped. Street
+        points with identical lidars thereby merge into one constraint.
+
+    Every decision is recorded in self.decisions as (rule, "lidar" or "street_point", id, value),
+    value being the lidar value or None for dropped street points.
+    """
+
+    default_rules = ("empty_lidars", "dominated_lidars", "forced_lidars", "dominated_street_points")
+
+    def __init__(self, incidence, rules = default_rules):
+        self.incidence = incidence.tocsr()
+        self.rules = tuple(rules)
+        self.active_street_points = np.ones(self.incidence.shape[0], dtype=bool)
+        self.active_lidars = np.ones(self.incidence.shape[1], dtype=bool)
+        self.radar0 = []
+        self.radar1 = []
+        self.decisions = []
+        self.passes = 0
+        self.stats = {rule: {"count": 0, "time": 0.0} for rule in self.rules}
+
+    def reduced(self):
+        """Incidence matrix of the active street points and lidars, with their ids."""
+        street_point_ids = np.flatnonzero(self.active_street_points)
+        lidar_ids = np.flatnonzero(self.active_lidars)
+        return self.incidence[street_point_ids][:, lidar_ids], street_point_ids, lidar_ids
+
+    def run(self):
+        changed = True
+        while changed:
+            changed = False
+            self.passes += 1
+            for rule in self.rules:
+                start_time = time.perf_counter()
+                count = getattr(self, rule)()
+                self.stats[rule]["time"] += time.perf_counter() - start_time
+                self.stats[rule]["count"] += count
+                changed |= count > 0
+        return self
+
+    def report(self):
+        return {"passes": self.passes, "rules": {rule: dict(stat) for rule, stat in self.stats.items()}}
+
+    def __set_lidars(self, rule, lidar_ids, value):
+        self.active_lidars[lidar_ids] = False
+        (self.radar1 if value else self.radar0).extend(lidar_ids.tolist())
+        self.decisions.extend((rule, "lidar", i, value) for i in lidar_ids.tolist())
+        return len(lidar_ids)
+
+    def __drop_street_points(self, rule, street_point_ids):
+        self.active_street_points[street_point_ids] = False
+        self.decisions.extend((rule, "street_point", i, None) for i in street_point_ids.tolist())
+        return len(street_point_ids)
+
+    def empty_lidars(self):
+        incidence, _, lidar_ids = self.reduced()
+        return self.__set_lidars("empty_lidars", lidar_ids[incidence.getnnz(axis=0) == 0], 0)
+
+    def dominated_lidars(self):
+        incidence, _, lidar_ids = self.reduced()
+        return self.__set_lidars("dominated_lidars", lidar_ids[dominated_columns(incidence)], 0)
+
+    def forced_lidars(self):
+        incidence, street_point_ids, lidar_ids = self.reduced()
+        single = np.flatnonzero(incidence.getnnz(axis=1) == 1)
+        forced = np.unique(incidence[single].indices)
+        if len(forced) == 0:
+            return 0
+        covered = incidence[:, forced].getnnz(axis=1) > 0
+        self.__drop_street_points("forced_lidars", street_point_ids[covered])
+        return self.__set_lidars("forced_lidars", lidar_ids[forced], 1)
+
+    def dominated_street_points(self):
+        incidence, street_point_ids, _ = self.reduced()
+        return self.__drop_street_points("dominated_street_points", street_point_ids[dominated_rows(incidence)])
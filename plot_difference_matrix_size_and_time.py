@@ -1,10 +1,7 @@
-import neal
-import numpy as np
-from data.sp_data import SPData
-from models import SPQuboBinary
-import time
+import os
+import tempfile
 import matplotlib.pyplot as plt
-from plotting.sp_plot import SPPlot
+from run_sweep import normalize_spec, ok_records, read_results, run
 
 # Configuration for LaTeX-style plots (optional)
 plt.rc("text", usetex=False)  # Disable LaTeX rendering in text
@@ -36,57 +33,56 @@ param_list = [
     {"version": 1, "num_cols": 150, "rad_max": 3.1}
 ]
 
-# Loop through each parameter configuration
-for idx, params in enumerate(param_list):
-    # Generate problem data for the given configuration
-    data = SPData().gen_problem(**params)
-    print(f"Processing with parameters (index {idx}): {params}")
-    node_counts.append(len(data.G.nodes))  # Record the number of nodes in the graph
+# Solver configuration
+config = {"num_reads": 1000, "num_sweeps": 1000}
 
-    # Solver configuration
-    config = {"num_reads": 1000, "num_sweeps": 1000}
-    solve_func = neal.SimulatedAnnealingSampler().sample_qubo
-
-    # Solve without preprocessing (process=False)
-    init_time_no_process = time.time()  # Start time
-    qubo_model_bin_no_process = SPQuboBinary(data, process=False)
-    time_qubo_no_process = time.time() - init_time_no_process  # Time taken to build the matrix Q
-    answer_no_process = qubo_model_bin_no_process.solve(solve_func, **config)
-    total_time_no_process = answer_no_process["runtime"] +time_qubo_no_process # Total runtime
+# Every configuration is solved without (process=False) and with (process=True) preprocessing.
+# The runs are done in parallel by run_sweep, results already in the output file are kept.
+# The ids are hashes of the runs, so changed parameters are never matched to old results
+runs = [
+    [normalize_spec({"instance": params, "solver": {"name": "neal", "process": process, "config": config}})
+     for process in (False, True)]
+    for params in param_list
+]
+specs = [spec for pair in runs for spec in pair]
 
-    # Solve with preprocessing (process=True)
-    init_time_with_process = time.time()  # Start time
-    qubo_model_bin_with_process = SPQuboBinary(data, process=True)
-    time_qubo_with_process = time.time() - init_time_with_process  # Time taken to build the matrix Q
-    answer_with_process = qubo_model_bin_with_process.solve(solve_func, **config)
-    total_time_with_process = answer_with_process["runtime"]+ time_qubo_with_process # Total runtime
+# the sweep runs in worker processes, which import this script again on spawn platforms
+if __name__ == "__main__":
+    results_file = "difference_matrix_size_and_time.jsonl"
+    run(specs, results_file, cache_dir=os.path.join(tempfile.gettempdir(), "sp_coverage_cache"))
+    results = read_results(results_file)
 
-    # Calculate the difference in matrix size and runtime
-    sizes_diff.append(
-        qubo_model_bin_no_process.model.shape[0] - qubo_model_bin_with_process.model.shape[0]
-    )  # Difference in QUBO matrix size
-    times_diff.append(total_time_no_process - total_time_with_process)  # Difference in runtime
+    for pair in runs:
+        # failed runs are skipped with a message
+        records = ok_records(results, pair)
+        if records is None:
+            continue
+        no_process, with_process = records
+        node_counts.append(with_process["nodes"])  # Record the number of nodes in the graph
+        # total_time: time taken to build the matrix Q plus the runtime of the sampler
+        sizes_diff.append(no_process["variables"] - with_process["variables"])  # Difference in QUBO matrix size
+        times_diff.append(no_process["total_time"] - with_process["total_time"])  # Difference in runtime
 
-# Plot the results
-fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))  
+    # Plot the results
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))  
 
-# First subplot: Difference in matrix size
-ax1.plot(node_counts, sizes_diff, label="$\Delta(Q_{M_1}-Q_{M_2})$", 
-         marker="o", color="blue", linestyle="None")
-ax1.set_xlabel(r"Number N of nodes in the system", fontsize=26)
-ax1.set_ylabel(r"Difference in Matrix Size", fontsize=26)
-ax1.legend(fontsize=20)
-ax1.grid(True)
+    # First subplot: Difference in matrix size
+    ax1.plot(node_counts, sizes_diff, label="$\Delta(Q_{M_1}-Q_{M_2})$", 
+             marker="o", color="blue", linestyle="None")
+    ax1.set_xlabel(r"Number N of nodes in the system", fontsize=26)
+    ax1.set_ylabel(r"Difference in Matrix Size", fontsize=26)
+    ax1.legend(fontsize=20)
+    ax1.grid(True)
 
-# Second subplot: Difference in runtime
-ax2.plot(node_counts, times_diff, label="$\Delta(t_{M_1}-t_{M_2})$[s]", 
-         marker="x", color="red", linestyle="None")
-ax2.set_xlabel(r"Number N of nodes in the system", fontsize=26)
-ax2.set_ylabel(r"Difference in Time (s)", fontsize=26)
-ax2.legend(fontsize=20)
-ax2.grid(True)
+    # Second subplot: Difference in runtime
+    ax2.plot(node_counts, times_diff, label="$\Delta(t_{M_1}-t_{M_2})$[s]", 
+             marker="x", color="red", linestyle="None")
+    ax2.set_xlabel(r"Number N of nodes in the system", fontsize=26)
+    ax2.set_ylabel(r"Difference in Time (s)", fontsize=26)
+    ax2.legend(fontsize=20)
+    ax2.grid(True)
 
-plt.tight_layout()
+    plt.tight_layout()
 
-plt.savefig("difference_matrix_size_and_time.png") 
-plt.show() 
+    plt.savefig("difference_matrix_size_and_time.png") 
+    plt.show() 
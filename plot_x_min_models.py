@@ -1,13 +1,8 @@
-import neal
-import numpy as np  
-from data.sp_data import SPData
-from models import SPQuboBinary
-from evaluation.evaluation import SPEvaluation
-from plotting.sp_plot import SPPlot
-import networkx as nx
-import copy
+import os
+import tempfile
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
+from run_sweep import normalize_spec, ok_records, read_results, run
 
 # Define multiple parameter sets to test
 """
@@ -52,69 +47,55 @@ params_list = [{"version": 1, "num_cols": 5, "rad_max": 2.0},
               {"version": 1, "num_cols": 150, "rad_max": 3.1}]
 # Configuration for the simulation
 config = {"num_reads": 1000, "num_sweeps": 1000}
-solve_func = neal.SimulatedAnnealingSampler().sample_qubo
 
-# Initialize lists to store results
-nodes_count = []
-objective_no_process = []
-objective_process = []
-violations_count = []
-
-# Loop over each parameter set
-for params in params_list:
-    data = SPData().gen_problem(**params) 
-    data_copy = copy.deepcopy(data)
-    
-    # Solve without processing 
-    qubo_model_bin_no_process = SPQuboBinary(data, process=False)
-    answer_True_no_process = qubo_model_bin_no_process.solve(solve_func, **config)
-    evaluation_no_process = SPEvaluation(data, answer_True_no_process['solution'])
-
-    # Solve with processing
-    qubo_model_bin_process = SPQuboBinary(data, process=True)
-    answer_True_process = qubo_model_bin_process.solve(solve_func, **config)
-    for key in qubo_model_bin_process.radar0:
-        answer_True_process['solution'][key] = np.int8(0)
-    for key in qubo_model_bin_process.radar1:
-        answer_True_process['solution'][key] = np.int8(1)
-    
-    def convert_keys_to_strings(solution):  # To have some proper solution shape
-        new_solution = {}
-        for key, value in solution.items():
-            if isinstance(key, tuple):
-                key = 'x_' + '_'.join(map(str, key))
-            new_solution[key] = value
-        return new_solution
-    answer_True_process['solution'] = convert_keys_to_strings(answer_True_process['solution'])
-    evaluation_process = SPEvaluation(data, answer_True_process['solution'])
+# Every parameter set is solved without (M_1) and with (M_2) processing. The runs are done in
+# parallel by run_sweep, results already in the output file are not computed again. The ids
+# are hashes of the runs, so changed parameters or configs are never matched to old results
+runs = [
+    [normalize_spec({"instance": params, "solver": {"name": "neal", "process": process, "config": config}})
+     for process in (False, True)]
+    for params in params_list
+]
+specs = [spec for pair in runs for spec in pair]
 
-    # Store the number of nodes, N(x_min), and violations
-    nodes_count.append(len(data_copy.G.nodes))  # Number of nodes in the graph
-    objective_no_process.append(evaluation_no_process.get_objective())  # number of lidars activated in x_min without processing
-    objective_process.append(evaluation_process.get_objective())  # number of lidars activated in x_min with processing
+# the sweep runs in worker processes, which import this script again on spawn platforms
+if __name__ == "__main__":
+    results_file = "plot_x_min_models.jsonl"
+    run(specs, results_file, cache_dir=os.path.join(tempfile.gettempdir(), "sp_coverage_cache"))
+    results = read_results(results_file)
 
-    # Count violated constraints
-    violations = 0
-    for constraint, violation_list in evaluation_process.check_solution().items():
-        if len(violation_list) > 0:
-            violations += len(violation_list)
-    violations_count.append(violations)
+    nodes_count = []  # Number of nodes in the graph
+    objective_no_process = []  # number of lidars activated in x_min without processing
+    objective_process = []  # number of lidars activated in x_min with processing
+    violations_count = []  # violated constraints with processing
+    for pair in runs:
+        # failed runs are skipped with a message
+        records = ok_records(results, pair)
+        if records is None:
+            continue
+        no_process, process = records
+        nodes_count.append(process["nodes"])
+        objective_no_process.append(no_process["objective"])
+        objective_process.append(process["objective"])
+        violations_count.append(process["violations"])
 
-norm = mcolors.Normalize(vmin=min(violations_count), vmax=max(violations_count))
-cmap = plt.get_cmap('viridis')
+    if not nodes_count:
+        raise SystemExit(f"no successful runs in {results_file}")
+    norm = mcolors.Normalize(vmin=min(violations_count), vmax=max(violations_count))
+    cmap = plt.get_cmap('viridis')
 
-# Plot the results
-fig, ax = plt.subplots(figsize=(12, 8))
-sc = ax.scatter(nodes_count, objective_no_process, c=violations_count, cmap=cmap, norm=norm, marker='o', s=100, label='$M_1$')  # Increased size for 'o'
-sc2 = ax.scatter(nodes_count, objective_process, c=violations_count, cmap=cmap, norm=norm, marker='x', s=150, label='$M_2$')  # Increased size for 'x'
+    # Plot the results
+    fig, ax = plt.subplots(figsize=(12, 8))
+    sc = ax.scatter(nodes_count, objective_no_process, c=violations_count, cmap=cmap, norm=norm, marker='o', s=100, label='$M_1$')  # Increased size for 'o'
+    sc2 = ax.scatter(nodes_count, objective_process, c=violations_count, cmap=cmap, norm=norm, marker='x', s=150, label='$M_2$')  # Increased size for 'x'
 
-cbar = plt.colorbar(sc, ax=ax)
-cbar.set_label('Number of Violated Constraints', fontsize=20)
+    cbar = plt.colorbar(sc, ax=ax)
+    cbar.set_label('Number of Violated Constraints', fontsize=20)
 
-ax.set_xlabel('Number N of Nodes', fontsize=26)
-ax.set_ylabel('$||x_{min}||=\sum_{i=1}^{N}x_{i}$', fontsize=26)
-ax.tick_params(axis='both', which='major', labelsize=20)
-ax.legend(fontsize=20)
-plt.grid(True)
-plt.savefig("plot_results_2models_version1.png", dpi=300)
-plt.show()
+    ax.set_xlabel('Number N of Nodes', fontsize=26)
+    ax.set_ylabel('$||x_{min}||=\sum_{i=1}^{N}x_{i}$', fontsize=26)
+    ax.tick_params(axis='both', which='major', labelsize=20)
+    ax.legend(fontsize=20)
+    plt.grid(True)
+    plt.savefig("plot_results_2models_version1.png", dpi=300)
+    plt.show()
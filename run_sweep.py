@@ -0,0 +1,350 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+from data.sp_data import SPData
+from data.sp_cache import CoverageCache
+from data.sp_metrics import tracer
+from data.glb_reader_small import create_problem_from_glb
+from evaluation.evaluation import SPEvaluation
+
+"""
+Parallel runner for parameter sweeps. Reads a JSONL file with one run per line
+
+    {"id": "v1_c50_p", "instance": {"version": 1, "num_cols": 50, "rad_max": 2.0},
+     "solver": {"name": "neal", "process": true, "config": {"num_reads": 1000, "num_sweeps": 1000}}}
+
+instance is one of
+    {"version", "num_cols", "rad_max", ["hor_basic_distance", "vert_basic_dist"]}   SPData.gen_problem
+    {"glb", "lidar_density", "street_point_density"}                                GLB scene
+    {"path"}                                                                        SPData.save directory
+optionally with "tile_size". solver is a name or a dict with "name" (neal, annealer, greedy,
+cplex), the SPQuboBinary options "process", "sparse", "P1", "P2", "P3", "repair" and the
+"config" passed to the sampler or solve. Without "id" the id is a hash of the run.
+
+The runs form a pipeline: builder processes generate the instances (one per distinct instance
+spec, however many solvers use it) and save them as instance directories, solver processes
+load them memory-mapped and run QUBO, sampling and evaluation. At most --prefetch instances are
+built ahead of the solvers. Every result is appended to the output JSONL as soon as it is
+finished; runs whose id already has an "ok" record there are skipped, so an interrupted sweep
+is resumed by starting it again with the same output.
+
+    python run_sweep.py sweep.jsonl results.jsonl --workers 8
+"""
+
+SOLVERS = ("neal", "annealer", "greedy", "cplex")
+
+
+def load_specs(path):
+    """Runs of the JSONL file with their ids, in file order."""
+    specs = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                specs.append(normalize_spec(json.loads(line)))
+    ids = [s["id"] for s in specs]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"duplicate ids in {path}")
+    return specs
+
+
+def normalize_spec(spec):
+    solver = spec.get("solver", "neal")
+    if isinstance(solver, str):
+        solver = {"name": solver}
+    if solver.get("name", "neal") not in SOLVERS:
+        raise ValueError(f"unknown solver {solver.get('name')}, available: {', '.join(SOLVERS)}")
+    res = {"instance": spec["instance"], "solver": dict({"name": "neal"}, **solver)}
+    res["id"] = str(spec["id"]) if "id" in spec else _digest(res)[:16]
+    return res
+
+
+def read_results(path):
+    """Records of the output JSONL {id: record}, later records replace earlier ones."""
+    res = {}
+    if not os.path.exists(path):
+        return res
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # the last line of an interrupted sweep may be cut off
+                continue
+            res[record["id"]] = record
+    return res
+
+
+def ok_records(results, specs):
+    """
+    Records of specs in results (see read_results), or None with a message if one of them
+    failed or is missing, so scripts can skip the point.
+    """
+    records = [results.get(spec["id"]) for spec in specs]
+    failed = [(spec, r) for spec, r in zip(specs, records) if r is None or r.get("status") != "ok"]
+    for spec, r in failed:
+        reason = "no result" if r is None else r.get("error", r.get("status"))
+        print(f"skipped {spec['id']} {spec['instance']}: {reason}")
+    return None if failed else records
+
+
+def run(specs, out, workers = None, build_workers = 1, prefetch = None, cache_dir = None,
+        instance_dir = None, keep_instances = False, trace = False):
+    """
+    Runs the specs (see load_specs) that have no "ok" record in out yet and appends their
+    records to out. Returns the number of runs done.
+    """
+    workers = workers or os.cpu_count()
+    prefetch = prefetch or workers
+    done = {i for i, r in read_results(out).items() if r.get("status") == "ok"}
+    # runs with equal ids (e.g. the same parameters listed twice) are done once
+    todo = list({s["id"]: s for s in specs if s["id"] not in done}.values())
+    print(f"{len(specs)} runs, {len(done & {s['id'] for s in specs})} already in {out}, {len(todo)} to do")
+    if not todo:
+        return 0
+    instance_dir = Path(instance_dir or f"{out}.instances")
+    instance_dir.mkdir(parents=True, exist_ok=True)
+
+    #runs grouped by instance, each instance is built only once
+    groups = {}
+    for spec in todo:
+        groups.setdefault(_digest(spec["instance"]), []).append(spec)
+    pending = deque(groups.items())
+    builds = {}
+    solves = {}
+    open_runs = {}
+    built = {}
+    finished = 0
+    _repair_tail(out)
+
+    with open(out, "a") as results, \
+            ProcessPoolExecutor(build_workers) as builders, \
+            ProcessPoolExecutor(workers) as solvers:
+
+        def write(record):
+            results.write(json.dumps(record, default=_json_default) + "\n")
+            results.flush()
+
+        def submit_solves(key, path, info):
+            built[key] = (path, info)
+            for spec in open_runs[key]:
+                solves[solvers.submit(_solve, spec, str(path), info, trace)] = (key, spec)
+
+        try:
+            while pending or builds or solves:
+                # only prefetch instances are built ahead of the solvers
+                while pending and len(builds) + len(built) < prefetch:
+                    key, runs = pending.popleft()
+                    open_runs[key] = list(runs)
+                    instance = runs[0]["instance"]
+                    if "path" in instance:
+                        submit_solves(key, Path(instance["path"]), {"build_time": 0.0})
+                    elif (instance_dir / key / "meta.json").exists():
+                        submit_solves(key, instance_dir / key, {"build_time": 0.0})
+                    else:
+                        builds[builders.submit(_build, instance, str(instance_dir / key), cache_dir)] = key
+
+                completed, _ = wait(list(builds) + list(solves), return_when=FIRST_COMPLETED)
+                for future in completed:
+                    if future in builds:
+                        key = builds.pop(future)
+                        try:
+                            info = future.result()
+                        except Exception as e:
+                            for spec in open_runs.pop(key):
+                                write(_error(spec, "build", e))
+                                finished += 1
+                                print(f"[{finished}/{len(todo)}] {spec['id']} failed: {e}")
+                            continue
+                        submit_solves(key, instance_dir / key, info)
+                    else:
+                        key, spec = solves.pop(future)
+                        try:
+                            record = future.result()
+                        except Exception as e:
+                            record = _error(spec, "solve", e)
+                        write(record)
+                        finished += 1
+                        print(f"[{finished}/{len(todo)}] {spec['id']}" + (f" failed: {record['error']}" if "error" in record else ""))
+                        open_runs[key].remove(spec)
+                        if not open_runs[key]:
+                            del open_runs[key]
+                            path, _ = built.pop(key)
+                            if not keep_instances and path.parent == instance_dir:
+                                shutil.rmtree(path, ignore_errors=True)
+        except KeyboardInterrupt:
+            for future in list(builds) + list(solves):
+                future.cancel()
+            print(f"interrupted after {finished} runs, start again with the same output to resume")
+            raise
+
+    if not keep_instances:
+        with contextlib.suppress(OSError):
+            instance_dir.rmdir()
+    return finished
+
+
+def build_instance(instance, cache = None):
+    """SPData of an instance spec."""
+    tile_size = instance.get("tile_size")
+    if "path" in instance:
+        return SPData.load(instance["path"], cache=cache, tile_size=tile_size)
+    if "glb" in instance:
+        problem_dict = create_problem_from_glb(instance["lidar_density"], instance["street_point_density"], filename=instance["glb"])
+        return SPData.create_cls(problem_dict, cache=cache, tile_size=tile_size)
+    params = {k: v for k, v in instance.items() if k != "tile_size"}
+    data = SPData.gen_problem(**params, cache=cache, tile_size=tile_size)
+    if data is None:
+        raise ValueError(f"no gen_problem version {instance.get('version')}")
+    return data
+
+
+def _build(instance, path, cache_dir):
+    """Builds the instance and saves it as instance directory path (written to a temporary directory first)."""
+    start_time = time.perf_counter()
+    cache = CoverageCache(cache_dir) if cache_dir else None
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = build_instance(instance, cache)
+    build_time = time.perf_counter() - start_time
+    path = Path(path)
+    tmp = Path(tempfile.mkdtemp(dir=path.parent, prefix=".tmp_"))
+    try:
+        data.save(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return {"build_time": build_time}
+
+
+def _solve(spec, path, info, trace):
+    """One run on the instance directory path, returns its record."""
+    from models import SPQuboBinary, SPAnnealer, SPGreedy, SPCplex
+
+    solver = spec["solver"]
+    name = solver["name"]
+    config = solver.get("config", {})
+    if trace:
+        tracer.reset()
+        tracer.enable()
+    record = {"id": spec["id"], "instance": spec["instance"], "solver": solver, "status": "ok"}
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = SPData.load(path)
+        record.update(
+            lidars=len(data.lidars),
+            street_points=len(data.street_points),
+            nodes=len(set(data.listLidar3D)) + len(set(data.listStreetPoints3D)),
+            edges=int(data.coverage.nnz),
+            build_time=info["build_time"],
+        )
+        if name in ("neal", "annealer"):
+            if name == "neal":
+                import neal
+                solve_func = neal.SimulatedAnnealingSampler().sample_qubo
+            else:
+                solve_func = SPAnnealer().sample_qubo
+            model = SPQuboBinary(
+                data, P1=solver.get("P1", 1), P2=solver.get("P2", 2), P3=solver.get("P3", 2),
+                process=solver.get("process", False), sparse=solver.get("sparse", False),
+            )
+            answer = model.solve(solve_func, repair=solver.get("repair", False), **config)
+            if not solver.get("repair", False):
+                model.merge_decisions(answer["solution"])
+            record.update(
+                variables=model.model.shape[0],
+                qubo_time=model.init_time,
+                energy=float(answer["energy"]),
+            )
+        elif name == "greedy":
+            answer = SPGreedy(data).solve(**config)
+            record["qubo_time"] = 0.0
+        else:
+            answer = SPCplex(data).solve(**config)
+            record["qubo_time"] = 0.0
+        start_time = time.perf_counter()
+        evaluation = SPEvaluation(data, answer["solution"])
+        evaluation_time = time.perf_counter() - start_time
+
+    record.update(
+        runtime=answer["runtime"],
+        total_time=record["qubo_time"] + answer["runtime"],
+        evaluation_time=evaluation_time,
+        objective=evaluation.get_objective(),
+        missing_achievable_coverage=evaluation.missing_achievable_coverage,
+        violations=sum(len(v) for v in evaluation.check_solution().values()),
+        worker=os.getpid(),
+    )
+    if trace:
+        tracer.disable()
+        record["trace"] = tracer.stages()
+    return record
+
+
+def _error(spec, stage, e):
+    return {"id": spec["id"], "instance": spec["instance"], "solver": spec["solver"], "status": "error",
+            "stage": stage, "error": f"{type(e).__name__}: {e}"}
+
+
+def _repair_tail(path):
+    """Cuts a last line without newline (run interrupted while writing), so records can be appended."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        content = f.read()
+        if content and not content.endswith(b"\n"):
+            f.truncate(content.rfind(b"\n") + 1)
+
+
+def _digest(obj):
+    return hashlib.sha256(json.dumps(obj, sort_keys=True).encode()).hexdigest()
+
+
+def _json_default(obj):
+    # numpy scalars
+    if hasattr(obj, "item"):
+        return obj.item()
+    return str(obj)
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Parallel parameter sweep of the sensor positioning pipeline.")
+    parser.add_argument("specs", help="JSONL file, one run (instance and solver) per line")
+    parser.add_argument("out", help="JSONL file the results are appended to, existing results are skipped")
+    parser.add_argument("--workers", type=int, default=None, help="solver processes, default: number of CPUs")
+    parser.add_argument("--build-workers", type=int, default=1, help="processes building instances")
+    parser.add_argument("--prefetch", type=int, default=None, help="instances built ahead of the solvers, default: --workers")
+    parser.add_argument("--cache", default=os.path.join(tempfile.gettempdir(), "sp_coverage_cache"), help="CoverageCache directory, '' to disable")
+    parser.add_argument("--instances", help="directory of the built instances, default: <out>.instances")
+    parser.add_argument("--keep-instances", action="store_true", help="keep the instance directories after their runs")
+    parser.add_argument("--trace", action="store_true", help="add the stages of data.sp_metrics.tracer to every record")
+    args = parser.parse_args(argv)
+
+    specs = load_specs(args.specs)
+    start_time = time.perf_counter()
+    try:
+        finished = run(
+            specs, args.out, workers=args.workers, build_workers=args.build_workers, prefetch=args.prefetch,
+            cache_dir=args.cache or None, instance_dir=args.instances, keep_instances=args.keep_instances,
+            trace=args.trace,
+        )
+    except KeyboardInterrupt:
+        return 130
+    failed = sum(1 for r in read_results(args.out).values() if r.get("status") != "ok")
+    print(f"{finished} runs in {time.perf_counter() - start_time:.1f}s, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+import pytest
+
+pytest.importorskip("docplex")
+
+from data.sp_data import SPData
+from models import SPCplex
+
+
+def mip_start_used_by_solve(model, monkeypatch):
+    """Lidar values of the MIP starts the docplex model holds when solve() runs it."""
+    docplex_model = model._CPlexSP__model
+    used = []
+
+    def solve(*args, **kwargs):
+        for start, _ in docplex_model.iter_mip_starts():
+            used.append([int(start.get_value(v)) for v in docplex_model.iter_binary_vars()])
+        raise _Solved()
+
+    monkeypatch.setattr(docplex_model, "solve", solve)
+    return used
+
+
+class _Solved(Exception):
+    pass
+
+
+def test_add_mip_start_is_used_by_solve(monkeypatch):
+    data = SPData.gen_problem(4, 1)
+    model = SPCplex(data)
+    used = mip_start_used_by_solve(model, monkeypatch)
+    model.add_mip_start([True, False, True, False])
+    with pytest.raises(_Solved):
+        model.solve()
+    assert used == [[1, 0, 1, 0]]
+
+
+def test_warm_start_replaces_earlier_start(monkeypatch):
+    data = SPData.gen_problem(4, 1)
+    model = SPCplex(data)
+    used = mip_start_used_by_solve(model, monkeypatch)
+    model.add_mip_start([True, True, True, True])
+    for _ in range(2):
+        with pytest.raises(_Solved):
+            model.solve(warm_start=[False, True, False, True])
+    assert used == [[0, 1, 0, 1], [0, 1, 0, 1]]
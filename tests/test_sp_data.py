@@ -0,0 +1,44 @@
+import numpy as np
+
+from data.sp_data import SPData
+from data.sp_solution import SPSolution
+
+
+def test_gen_problem_legacy_keys():
+    # format of the keys before the array-based generation: x and y float, height float,
+    # yaw and pitch int as given to problem_generator
+    expected = {
+        1: ["x_0.0_0.0_2.5_0_-10", "x_1.0_0.0_2.5_0_-10", "x_2.0_0.0_2.5_0_-10"],
+        2: ["x_0.0_0.0_2.5_0_-10", "x_1.0_0.0_2.5_0_-10", "x_2.0_0.0_2.5_0_-10"],
+        3: ["x_0.0_0.0_2.5_0_-10", "x_1.0_0.0_2.5_0_-10", "x_2.0_0.0_2.5_0_-10",
+            "x_0.0_4.0_2.5_0_-10", "x_1.0_4.0_2.5_0_-10", "x_2.0_4.0_2.5_0_-10"],
+    }
+    for version, keys in expected.items():
+        data = SPData.gen_problem(3, version)
+        assert [data.lidar_key(i) for i in range(len(data.lidars))] == keys
+        assert list(SPSolution(data)) == keys
+        assert data.listLidar3D[0] == (0.0, 0.0, 2.5, 0, -10)
+        assert [type(v) for v in data.listLidar3D[0]] == [float, float, float, int, int]
+
+
+def test_gen_problem_keys_survive_save_and_load(tmp_path):
+    data = SPData.gen_problem(5, 3)
+    data.save(tmp_path / "instance")
+    loaded = SPData.load(tmp_path / "instance")
+    assert loaded.listLidar3D == data.listLidar3D
+    assert [loaded.lidar_key(i) for i in range(len(loaded.lidars))] == [data.lidar_key(i) for i in range(len(data.lidars))]
+    assert np.array_equal(loaded.coverage.toarray(), data.coverage.toarray())
+
+
+def test_save_and_load_short_wall_rows(tmp_path):
+    problem_dict = {
+        'listLidar': [[0.5, 0.5, 2.5, 0, -10]],
+        'listCovering': [[0.5, 1.0], [1.5, 0.5]],
+        'wall': [[[1, 0], [1, 1], 3, 0, 0, 0, 0], [[0, 0], [0, 1], 3, 0, 0, 0, 0, -10]],
+    }
+    data = SPData.create_cls(problem_dict)
+    data.save(tmp_path / "instance")
+    loaded = SPData.load(tmp_path / "instance")
+    assert loaded.schemeGraph['wall'] == problem_dict['wall']
+    assert loaded.walls3D == data.walls3D
+    assert np.array_equal(loaded.coverage.toarray(), data.coverage.toarray())